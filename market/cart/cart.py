@@ -1,13 +1,192 @@
-import datetime
-import json
+import time
 
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
 
 from shops.models import Offer
 from .models import Cart as CartModel, CartItem
 
 
+PENDING_KEY = "cart.pending.{user_id}"
+SCHEDULED_KEY = "cart.scheduled.{user_id}"
+# Ключ сессии с id пользователя, с корзиной которого уже объединена корзина сессии
+MERGED_USER_KEY = "cart_merged_user"
+
+
+def offer_price(offer: Offer):
+    """Цена предложения в корзине: цена со скидкой, если она уже рассчитана"""
+    return offer.discount_price or offer.price
+
+
+def store_cart(user_id: int, quantities: dict) -> None:
+    """
+    Сохраняем корзину пользователя в бд.
+    В бд записывается только разница с сохраненной корзиной: одна вставка с обновлением и одно удаление.
+    Измененные строки получают снимок текущей цены и ее версии, сумма корзины пересчитывается по снимкам
+    :param quantities: dict {id предложения: количество}
+    """
+    cart_in_db, _ = CartModel.objects.get_or_create(user_id=user_id)
+    stored = {
+        offer_id: (quantity, price)
+        for offer_id, quantity, price in CartItem.objects.filter(cart=cart_in_db).values_list(
+            "offer_id", "quantity", "price"
+        )
+    }
+    changed_ids = [
+        offer_id for offer_id, quantity in quantities.items() if stored.get(offer_id, (None,))[0] != quantity
+    ]
+    lines = {offer_id: stored[offer_id] for offer_id in quantities.keys() & stored.keys()}
+    if changed_ids:
+        offers = Offer.objects.only("price", "discount_price", "price_version").in_bulk(changed_ids)
+        changed = [
+            CartItem(
+                cart=cart_in_db,
+                offer=offer,
+                quantity=quantities[offer.pk],
+                price=offer_price(offer),
+                price_version=offer.price_version,
+            )
+            for offer in offers.values()
+        ]
+        CartItem.objects.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=["cart", "offer"],
+            update_fields=["quantity", "price", "price_version", "stale"],
+        )
+        lines.update({item.offer_id: (item.quantity, item.price) for item in changed})
+    removed = stored.keys() - quantities.keys()
+    if removed:
+        CartItem.objects.filter(cart=cart_in_db, offer_id__in=removed).delete()
+    if changed_ids or removed:
+        total_price = sum(quantity * price for quantity, price in lines.values())
+        CartModel.objects.filter(pk=cart_in_db.pk).update(total_price=total_price, updated_at=timezone.now())
+
+
+def mark_carts_stale(offer_ids) -> None:
+    """
+    Помечаем устаревшими строки корзин с предложениями, цена которых изменилась.
+    Индекс CartItem по предложению служит обратным индексом предложение -> корзины
+    """
+    items = CartItem.objects.filter(offer_id__in=offer_ids)
+    CartModel.objects.filter(pk__in=items.values("cart_id")).update(stale=True)
+    items.update(stale=True)
+
+
+def revalidate_cart(cart_in_db: CartModel) -> list:
+    """
+    Обновляем снимки цен только у помеченных строк корзины, сумма корзины корректируется на разницу.
+    Возвращает строки, цена которых изменилась
+    """
+    if not cart_in_db.stale:
+        return []
+    lines = list(CartItem.objects.filter(cart=cart_in_db, stale=True).select_related("offer"))
+    changed = []
+    for line in lines:
+        line.stale = False
+        if line.price_version != line.offer.price_version:
+            price = offer_price(line.offer)
+            cart_in_db.total_price += (price - line.price) * line.quantity
+            line.price, line.price_version = price, line.offer.price_version
+            changed.append(line)
+    CartItem.objects.bulk_update(lines, ["price", "price_version", "stale"])
+    cart_in_db.stale = False
+    cart_in_db.save(update_fields=["total_price", "stale"])
+    return changed
+
+
+def merge_quantities(in_session: dict, stored: dict, policy: str = "sum") -> dict:
+    """
+    Объединение корзин по id предложений. Предложения только одной стороны переносятся как есть,
+    для общих количество выбирается политикой: sum - сумма, max - большее, session или db - с этой стороны
+    """
+    merged = {**stored, **in_session}
+    for offer_id in in_session.keys() & stored.keys():
+        if policy == "sum":
+            merged[offer_id] = in_session[offer_id] + stored[offer_id]
+        elif policy == "max":
+            merged[offer_id] = max(in_session[offer_id], stored[offer_id])
+        elif policy == "db":
+            merged[offer_id] = stored[offer_id]
+    return merged
+
+
+def flush_pending_cart(user_id: int) -> None:
+    """Записываем в бд последнее отложенное состояние корзины пользователя, если оно есть, и удаляем его.
+    Если за время записи состояние изменилось, оно остается для задачи, поставленной этим изменением"""
+    cache.delete(SCHEDULED_KEY.format(user_id=user_id))
+    key = PENDING_KEY.format(user_id=user_id)
+    quantities = cache.get(key)
+    if quantities is not None:
+        store_cart(user_id, quantities)
+        if cache.get(key) == quantities:
+            cache.delete(key)
+
+
+def schedule_cart_persist(user_id: int, quantities: dict) -> None:
+    """
+    Откладываем запись корзины в бд на CART_PERSIST_DELAY секунд.
+    Изменения за это время объединяются: в кэше хранится последнее состояние, задача ставится один раз
+    """
+    cache.set(PENDING_KEY.format(user_id=user_id), quantities, settings.CACHE_TIME_PER_DAY)
+    if cache.add(SCHEDULED_KEY.format(user_id=user_id), 1, settings.CART_PERSIST_DELAY):
+        from .tasks import persist_cart
+
+        transaction.on_commit(lambda: persist_cart.apply_async((user_id,), countdown=settings.CART_PERSIST_DELAY))
+
+
+class CartSnapshot:
+    """
+    Снимок корзины: все предложения загружаются одним запросом, итоги считаются один раз.
+    Цены строк берутся через offer_price, как в снимках цен сохраненной корзины и при оформлении заказа.
+    Движок скидок получает в products цены без скидки: скидки магазина он применяет сам
+    """
+
+    def __init__(self, cart: dict):
+        self.signature = self.get_signature(cart)
+        offers = Offer.objects.select_related("product__category", "shop").in_bulk([int(key) for key in cart])
+        self.items = []
+        for key, value in cart.items():
+            offer = offers.get(int(key))
+            if offer is None:
+                self.items = []
+                continue
+            self.items.append(
+                {
+                    "offer": offer,
+                    "price": offer_price(offer),
+                    "quantity": value["quantity"],
+                    "created_at": value["created_at"],
+                }
+            )
+
+    @staticmethod
+    def get_signature(cart: dict) -> tuple:
+        """Состав корзины: снимок действителен, пока состав не изменился"""
+        return tuple((str(key), value["quantity"]) for key, value in cart.items())
+
+    @cached_property
+    def products(self) -> dict:
+        return {
+            item["offer"].product: {
+                "pcs": item["quantity"],
+                "unit_price": item["offer"].price,
+            }
+            for item in self.items
+        }
+
+    @cached_property
+    def total_price(self):
+        return sum([item["price"] * item["quantity"] for item in self.items])
+
+    @cached_property
+    def products_quantity(self) -> int:
+        return sum([item["quantity"] for item in self.items])
+
+
 class Cart(object):
     """
     Класс корзины
@@ -15,6 +194,7 @@ class Cart(object):
 
     def __init__(self, request):
         # initialization customer cart
+        self.request = request
         self.value = request.POST.get("value_amount")
         self.session = request.session
         self.user = request.user
@@ -24,71 +204,112 @@ class Cart(object):
         self.cart = cart
 
     def __iter__(self):
-        cart = self.cart_to_json(self.cart)
-        for item in cart:
+        for item in self.snapshot.items:
             yield item
 
+    @property
+    def snapshot(self) -> CartSnapshot:
+        """Снимок корзины, общий для всех объектов Cart текущего запроса.
+        Пересоздается, только если состав корзины изменился"""
+        snapshot = getattr(self.request, "_cart_snapshot", None)
+        if snapshot is None or snapshot.signature != CartSnapshot.get_signature(self.cart):
+            snapshot = self.request._cart_snapshot = CartSnapshot(self.cart)
+        return snapshot
+
     @staticmethod
     def cart_to_json(cart):
         """Возвращаем корзину из сессии в формате json"""
-        cart_json = []
-        for key, value in cart.items():
-            try:
-                offer = Offer.objects.get(id=key)
-                cart_json.append(
-                    {
-                        "offer": offer,
-                        "quantity": cart[key]["quantity"],
-                        "created_at": cart[key]["created_at"],
-                    }
-                )
-            except ObjectDoesNotExist:
-                cart_json = []
-        return cart_json
+        return CartSnapshot(cart).items
+
+    @property
+    def summary(self) -> dict:
+        """Краткие итоги корзины для шапки сайта: количество товаров и общая цена.
+        Хранятся в сессии и обновляются при каждом изменении корзины, поэтому не требуют запросов к бд"""
+        summary = self.session.get(settings.CART_SUMMARY_SESSION_ID)
+        if summary is None:
+            summary = self.update_summary() if self.cart else {"quantity": 0, "total_price": "0"}
+        return summary
+
+    def update_summary(self) -> dict:
+        """Пересчитываем итоги корзины в сессии"""
+        summary = self.session[settings.CART_SUMMARY_SESSION_ID] = {
+            "quantity": self.snapshot.products_quantity,
+            "total_price": str(self.snapshot.total_price),
+        }
+        return summary
 
     def save(self):
-        """Сохраняем корзину в сессии"""
+        """Сохраняем корзину и ее итоги в сессии"""
         self.session[settings.CART_SESSION_ID] = self.cart
+        self.update_summary()
         self.session.modified = True
 
+    def get_quantities(self) -> dict:
+        """Количество товара по id предложений корзины"""
+        return {item["offer"].id: item["quantity"] for item in self.snapshot.items}
+
     def save_to_db(self):
         """
         Если пользователь аутентифицирован, то сохраняем данные корзины в бд
         """
         if self.user.is_authenticated:
-            try:
-                cart_in_db = CartModel.objects.get(user=self.user)
-            except ObjectDoesNotExist:
-                cart_in_db = CartModel.objects.create(user=self.user)
-            cart_in_session = self.cart_to_json(self.cart)
-            for item_in_db in CartItem.objects.filter(cart=cart_in_db):
-                if not any(item_in_db == item_session for item_session in cart_in_session):
-                    item_in_db.delete()
-            for session_item in cart_in_session:
-                if CartItem.objects.filter(cart=cart_in_db).filter(offer=session_item["offer"].id).exists():
-                    cart_item = CartItem.objects.filter(cart=cart_in_db).get(offer=session_item["offer"])
-                    cart_item.quantity = session_item["quantity"]
-                    cart_item.save()
-                else:
-                    cart_item = CartItem(
-                        cart=cart_in_db,
-                        offer=session_item["offer"],
-                        quantity=session_item["quantity"],
-                        created_at=session_item["created_at"],
-                    )
-                    cart_item.save()
-
-    def save_to_session(self):
-        """Сохраняем корзину из бд в сессиею"""
-        cart_in_db = CartModel.objects.filter(user=self.user).first()
-        if cart_in_db:
-            cart_items = CartItem.objects.filter(cart=cart_in_db)
-            for item_in_db in cart_items:
-                self.cart[item_in_db.offer.id] = {
-                    "quantity": item_in_db.quantity,
-                    "created_at": json.dumps(item_in_db.created_at, default=str),
+            store_cart(self.user.id, self.get_quantities())
+
+    def persist(self):
+        """
+        Сохраняем изменение корзины аутентифицированного пользователя.
+        В режиме CART_WRITE_BEHIND сессия остается основной копией, а запись в бд выполняет отложенная задача
+        """
+        if not self.user.is_authenticated:
+            return
+        if settings.CART_WRITE_BEHIND:
+            schedule_cart_persist(self.user.id, self.get_quantities())
+        else:
+            self.save_to_db()
+
+    def flush(self):
+        """Синхронно сохраняем корзину в бд, отменяя отложенную запись. Вызывается при оформлении заказа"""
+        if self.user.is_authenticated:
+            cache.delete(PENDING_KEY.format(user_id=self.user.id))
+            self.save_to_db()
+
+    def merge_on_login(self):
+        """
+        Объединяем корзину сессии с сохраненной корзиной пользователя при входе.
+        Каждая сторона читается одним запросом, количество общих предложений выбирается по CART_MERGE_POLICY,
+        результат записывается в сессию и в бд в одной транзакции.
+        При повторном входе в той же сессии ее корзина уже загружена из бд и в объединении не участвует
+        """
+        with transaction.atomic():
+            pending = cache.get(PENDING_KEY.format(user_id=self.user.id))
+            stored = {
+                offer_id: (quantity, int(created_at.timestamp()))
+                for offer_id, quantity, created_at in CartItem.objects.filter(cart__user=self.user).values_list(
+                    "offer_id", "quantity", "created_at"
+                )
+            }
+            if pending is not None:
+                stored = {
+                    offer_id: (quantity, stored.get(offer_id, (0, int(time.time())))[1])
+                    for offer_id, quantity in pending.items()
                 }
+            if self.session.get(MERGED_USER_KEY) == self.user.id:
+                in_session = {}
+            else:
+                in_session = {int(offer_id): item for offer_id, item in self.cart.items()}
+            quantities = merge_quantities(
+                {offer_id: item["quantity"] for offer_id, item in in_session.items()},
+                {offer_id: quantity for offer_id, (quantity, _) in stored.items()},
+                settings.CART_MERGE_POLICY,
+            )
+            self.cart.clear()
+            for offer_id, quantity in quantities.items():
+                created_at = in_session[offer_id]["created_at"] if offer_id in in_session else stored[offer_id][1]
+                self.cart[str(offer_id)] = {"quantity": quantity, "created_at": created_at}
+            self.session[MERGED_USER_KEY] = self.user.id
             self.save()
+            cache.delete(PENDING_KEY.format(user_id=self.user.id))
+            store_cart(self.user.id, self.get_quantities())
 
     def add_to_cart(self, offer: Offer):
         """
@@ -100,13 +321,12 @@ class Cart(object):
         if offer_id in self.cart:
             self.cart_quantity_change(offer)
         else:
-            self.cart[offer.id] = {
+            self.cart[offer_id] = {
                 "quantity": int(self.value),
-                "created_at": json.dumps(datetime.datetime.now(), default=str),
+                "created_at": int(time.time()),
             }
-        self.session[settings.CART_SESSION_ID] = self.cart
-        self.session.modified = True
-        self.save_to_db()
+        self.save()
+        self.persist()
 
     def delete_from_cart(self, offer: Offer):
         """
@@ -115,8 +335,8 @@ class Cart(object):
         """
         offer_id = str(offer.id)
         self.cart.pop(offer_id)
-        self.session.modified = True
-        self.save_to_db()
+        self.save()
+        self.persist()
 
     def cart_quantity_change(self, offer: Offer):
         """ "Изменение товара в корзине, если товара меньше 0 удаляем товар из корзины"""
@@ -129,39 +349,26 @@ class Cart(object):
             self.cart[offer_id]["quantity"] += int(self.value)
         if self.cart[offer_id]["quantity"] == 0:
             self.cart.pop(offer_id)
-            self.session.modified = True
-        self.save_to_db()
+        self.save()
+        self.persist()
 
     def get_products(self):
         """
         Возвращаем словарь с ключом Product значением словарь со значениями количество товара и цена товара
         :return: dict
         """
-        cart = self.cart_to_json(self.cart)
-        products = {
-            item["offer"].product: {
-                "pcs": item["quantity"],
-                "unit_price": item["offer"].price,
-            }
-            for item in cart
-        }
-        return products
+        return self.snapshot.products
 
     def get_total_price(self):
         """
         Возвращаем общую цену товаров в корзине
         :return: decimal
         """
-
-        json_cart = self.cart_to_json(self.cart)
-        total_price = sum([item["offer"].price * item["quantity"] for item in json_cart])
-        return total_price
+        return self.snapshot.total_price
 
     def get_products_quantity(self):
         """
         Возвращаем общую цену товаров в корзине
         :return: decimal
         """
-        json_cart = self.cart_to_json(self.cart)
-        products_quantity = sum([item["quantity"] for item in json_cart])
-        return products_quantity
+        return self.snapshot.products_quantity
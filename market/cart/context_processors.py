@@ -1,5 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
 from .cart import Cart
 
 
 def cart(request):
-    return {"cart": Cart(request)}
+    """Корзина создается, только если шаблон к ней обращается"""
+    return {"cart": SimpleLazyObject(lambda: Cart(request))}
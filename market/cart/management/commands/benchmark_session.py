@@ -0,0 +1,72 @@
+import json
+import random
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.management.base import BaseCommand
+
+from config.session_serializer import MsgPackSerializer
+
+
+class Command(BaseCommand):
+    """Сравнение размера и времени (де)сериализации сессии магазина в JSON и msgpack"""
+
+    help = "Выводит размер сессии в байтах и время кодирования и чтения в мкс для прежнего JSON и msgpack"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=20, help="Предложений в корзине")
+        parser.add_argument("--repeat", type=int, default=2000, help="Количество повторов")
+
+    def handle(self, *args, **options):
+        offer_ids = random.sample(range(1, 100_000), options["items"])
+        legacy = self.session(
+            {
+                str(offer_id): {
+                    "quantity": random.randint(1, 5),
+                    "created_at": json.dumps(datetime.now(), default=str),
+                }
+                for offer_id in offer_ids
+            }
+        )
+        compact = self.session(
+            {
+                str(offer_id): {"quantity": random.randint(1, 5), "created_at": int(time.time())}
+                for offer_id in offer_ids
+            }
+        )
+        self.report("JSON", legacy, signing.JSONSerializer, options["repeat"])
+        self.report("msgpack", compact, MsgPackSerializer, options["repeat"])
+
+    @staticmethod
+    def session(cart: dict) -> dict:
+        """Типичная сессия покупателя: авторизация, корзина, сравнение, фильтр и поиск каталога"""
+        return {
+            "_auth_user_id": "42",
+            "_auth_user_backend": "django.contrib.auth.backends.ModelBackend",
+            "_auth_user_hash": "0" * 64,
+            settings.CART_SESSION_ID: cart,
+            settings.CART_SUMMARY_SESSION_ID: {"quantity": len(cart), "total_price": "12345.00"},
+            "comp_list": [str(offer_id) for offer_id in list(cart)[:4]],
+            "filter": {"price": "5000;20000", "name": "ноутбук", "in_stock": True, "free_delivery": False},
+            "search": "ноутбук",
+            "sorted": "price",
+            "path": "/catalog/laptops/",
+        }
+
+    def report(self, title: str, session: dict, serializer, repeat: int) -> None:
+        """Кодирование как в SessionBase.encode: сериализация, сжатие и подпись"""
+        salt = "django.contrib.sessions.SessionStore"
+        started = time.perf_counter()
+        for _ in range(repeat):
+            encoded = signing.dumps(session, salt=salt, serializer=serializer, compress=True)
+        dumps = (time.perf_counter() - started) / repeat * 1_000_000
+        started = time.perf_counter()
+        for _ in range(repeat):
+            signing.loads(encoded, salt=salt, serializer=serializer)
+        loads = (time.perf_counter() - started) / repeat * 1_000_000
+        raw = len(serializer().dumps(session))
+        self.stdout.write(
+            f"{title}: {raw} байт, в хранилище {len(encoded)} байт, запись {dumps:.1f} мкс, чтение {loads:.1f} мкс"
+        )
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:57
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicates(apps, schema_editor):
+    """Перед добавлением ограничения оставляем по одной записи предложения в корзине - последнюю добавленную"""
+    CartItem = apps.get_model("cart", "CartItem")
+    duplicates = (
+        CartItem.objects.values("cart_id", "offer_id").annotate(last=Max("pk"), count=Count("pk")).filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        CartItem.objects.filter(cart_id=duplicate["cart_id"], offer_id=duplicate["offer_id"]).exclude(
+            pk=duplicate["last"]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shops", "0001_initial"),
+        ("cart", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="cartitem",
+            unique_together={("cart", "offer")},
+        ),
+    ]
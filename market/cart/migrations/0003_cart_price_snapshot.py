@@ -0,0 +1,44 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+def mark_stale(apps, schema_editor):
+    """У сохраненных корзин снимков цен еще нет: они будут сняты при следующей проверке корзины"""
+    apps.get_model("cart", "CartItem").objects.update(stale=True)
+    apps.get_model("cart", "Cart").objects.filter(offers__isnull=False).update(stale=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0002_cartitem_unique_offer"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="stale",
+            field=models.BooleanField(default=False, verbose_name="цены устарели"),
+        ),
+        migrations.AddField(
+            model_name="cart",
+            name="total_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name="сумма корзины"),
+        ),
+        migrations.AddField(
+            model_name="cartitem",
+            name="price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name="цена при добавлении"),
+        ),
+        migrations.AddField(
+            model_name="cartitem",
+            name="price_version",
+            field=models.PositiveIntegerField(default=0, verbose_name="версия цены предложения"),
+        ),
+        migrations.AddField(
+            model_name="cartitem",
+            name="stale",
+            field=models.BooleanField(default=False, verbose_name="цена устарела"),
+        ),
+        migrations.RunPython(mark_stale, migrations.RunPython.noop),
+    ]
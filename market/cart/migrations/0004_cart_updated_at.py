@@ -0,0 +1,20 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("cart", "0003_cart_price_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="updated_at",
+            field=models.DateTimeField(
+                db_index=True, default=django.utils.timezone.now, verbose_name="дата изменения"
+            ),
+        ),
+    ]
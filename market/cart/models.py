@@ -1,5 +1,6 @@
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from users.models import CustomUser as User
@@ -23,6 +24,9 @@ class Cart(models.Model):
         verbose_name=_("пользователь"),
     )
     offer = models.ManyToManyField("shops.Offer", through="CartItem", verbose_name=_("предложение"))
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name=_("сумма корзины"))
+    stale = models.BooleanField(default=False, verbose_name=_("цены устарели"))
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True, verbose_name=_("дата изменения"))
 
 
 class CartItem(models.Model):
@@ -33,6 +37,7 @@ class CartItem(models.Model):
     class Meta:
         verbose_name = _("товар в корзине")
         verbose_name_plural = _("товары в корзине")
+        unique_together = (("cart", "offer"),)
 
     cart = models.ForeignKey(
         Cart,
@@ -47,3 +52,6 @@ class CartItem(models.Model):
         default=1,
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name=_("цена при добавлении"))
+    price_version = models.PositiveIntegerField(default=0, verbose_name=_("версия цены предложения"))
+    stale = models.BooleanField(default=False, verbose_name=_("цена устарела"))
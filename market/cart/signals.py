@@ -1,13 +1,12 @@
 from django.contrib.auth import user_logged_in
-from django.dispatch import receiver
+from django.dispatch import Signal, receiver
 from cart.cart import Cart
 
+# Итоги очистки заброшенных корзин: cutoff, carts, items, batches
+carts_swept = Signal()
+
 
 @receiver(user_logged_in)
 def after_user_logged_in(request, sender, user, **kwargs):
-    """Отслеживаем сигнал входа пользователя на сайт и добавляем корзину в бд или в сессию"""
-    cart = Cart(request)
-    if cart.get_products_quantity() == 0:
-        cart.save_to_session()
-    else:
-        cart.save_to_db()
+    """Отслеживаем сигнал входа пользователя на сайт и объединяем корзину сессии с корзиной в бд"""
+    Cart(request).merge_on_login()
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Cart as CartModel, CartItem
+from .signals import carts_swept
+
+
+def sweep_abandoned_carts(idle_days: int = None, batch_size: int = None) -> dict:
+    """
+    Удаляем корзины, которые не изменялись дольше CART_IDLE_DAYS дней.
+    Корзины выбираются по индексу updated_at и удаляются вместе с товарами пачками по CART_SWEEP_BATCH_SIZE,
+    каждая пачка - отдельным коротким удалением. Корзина, измененная после выборки, не удаляется.
+    Итоги отправляются сигналом carts_swept
+    """
+    idle_days = settings.CART_IDLE_DAYS if idle_days is None else idle_days
+    batch_size = batch_size or settings.CART_SWEEP_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(days=idle_days)
+    totals = {"carts": 0, "items": 0, "batches": 0}
+    while True:
+        cart_ids = list(
+            CartModel.objects.filter(updated_at__lt=cutoff)
+            .order_by("updated_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not cart_ids:
+            break
+        _, deleted = CartModel.objects.filter(pk__in=cart_ids, updated_at__lt=cutoff).delete()
+        totals["carts"] += deleted.get(CartModel._meta.label, 0)
+        totals["items"] += deleted.get(CartItem._meta.label, 0)
+        totals["batches"] += 1
+        if len(cart_ids) < batch_size:
+            break
+    carts_swept.send(sender=CartModel, cutoff=cutoff, **totals)
+    return totals
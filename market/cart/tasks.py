@@ -0,0 +1,15 @@
+from cart.cart import flush_pending_cart
+from cart.sweeper import sweep_abandoned_carts
+from config.celery import app
+
+
+@app.task(name="persist_cart")
+def persist_cart(user_id: int):
+    """Отложенная запись корзины пользователя в бд"""
+    flush_pending_cart(user_id)
+
+
+@app.task(name="sweep_abandoned_carts")
+def sweep_carts():
+    """Периодическое удаление заброшенных корзин"""
+    return sweep_abandoned_carts()
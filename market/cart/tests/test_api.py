@@ -0,0 +1,44 @@
+from django.urls import reverse
+
+from cart.tests.test_cart import CartTestCase
+
+
+class CartItemAPITest(CartTestCase):
+    """Класс тестирования API строк корзины"""
+
+    def url(self, offer) -> str:
+        return reverse("cart:cart_item_api", args=[offer.id])
+
+    def test_line_changes(self):
+        """Ответ содержит измененную строку, итоги корзины и количество для шапки"""
+        response = self.client.post(self.url(self.offers[0]), {"quantity": 2}, content_type="application/json")
+        self.assertEqual(
+            response.json(),
+            {"offer": self.offers[0].id, "quantity": 2, "subtotal": "200.00", "cart": self.summary(2, 200)},
+        )
+        self.client.post(self.url(self.offers[1]), {"quantity": 1}, content_type="application/json")
+        with self.assertNumQueries(1):
+            response = self.client.patch(self.url(self.offers[0]), {"value": "+"}, content_type="application/json")
+        self.assertEqual(
+            response.json(),
+            {"offer": self.offers[0].id, "quantity": 3, "subtotal": "300.00", "cart": self.summary(4, 550)},
+        )
+        response = self.client.delete(self.url(self.offers[1]))
+        self.assertEqual(
+            response.json(), {"offer": self.offers[1].id, "quantity": 0, "subtotal": "0", "cart": self.summary(3, 300)}
+        )
+        self.assertEqual(self.client.session["cart_summary"], self.summary(3, 300))
+
+    def test_errors(self):
+        """Неверное количество и предложения вне корзины"""
+        self.assertEqual(self.client.post(self.url(self.offers[0]), {"quantity": "x"}).status_code, 400)
+        self.assertEqual(
+            self.client.patch(self.url(self.offers[0]), {"value": "+"}, content_type="application/json").status_code,
+            404,
+        )
+        self.assertEqual(self.client.delete(self.url(self.offers[0])).status_code, 404)
+        self.assertEqual(self.client.post(reverse("cart:cart_item_api", args=[0])).status_code, 404)
+
+    @staticmethod
+    def summary(quantity: int, total_price: int) -> dict:
+        return {"quantity": quantity, "total_price": f"{total_price}.00"}
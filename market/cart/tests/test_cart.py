@@ -0,0 +1,320 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from cart.cart import PENDING_KEY, Cart, flush_pending_cart, merge_quantities, revalidate_cart
+from cart.context_processors import cart as cart_context
+from cart.models import Cart as CartModel, CartItem
+from cart.signals import carts_swept
+from cart.sweeper import sweep_abandoned_carts
+from cart.tasks import persist_cart
+from products.models import Product
+from shops.models import Shop, Offer
+from shops.services.order import pryce_delivery
+from users.models import CustomUser
+
+
+class CartTestCase(TestCase):
+    """Корзина анонимного пользователя из трех предложений одного магазина"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create(username="user_test", password="123", email="testuser@gmail.com")
+        shop = Shop.objects.create(name="test_shop", user=user)
+        cls.offers = [
+            Offer.objects.create(shop=shop, product=Product.objects.create(name=f"product {price}"), price=price)
+            for price in (100, 250, 40)
+        ]
+
+    def get_request(self, quantities: dict):
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        request.session["cart"] = {
+            str(offer.id): {"quantity": quantity, "created_at": '"2023-08-01 10:00:00"'}
+            for offer, quantity in zip(self.offers, quantities)
+        }
+        return request
+
+
+class CartSnapshotTest(CartTestCase):
+    """Класс тестирования снимка корзины"""
+
+    def test_one_query_per_request(self):
+        """Все методы корзины и обращения к продукту и магазину выполняются за один запрос"""
+        request = self.get_request([2, 1, 5])
+        with self.assertNumQueries(1):
+            cart = Cart(request)
+            self.assertEqual(cart.get_total_price(), 650)
+            self.assertEqual(cart.get_products_quantity(), 8)
+            self.assertEqual(len(cart.get_products()), 3)
+            self.assertEqual([item["offer"].shop.name for item in cart], ["test_shop"] * 3)
+            self.assertEqual(Cart(request).get_total_price(), 650)
+
+    def test_snapshot_follows_changes(self):
+        """После изменения количества снимок пересоздается"""
+        request = self.get_request([2, 1])
+        cart = Cart(request)
+        self.assertEqual(cart.get_products_quantity(), 3)
+        cart.value = "+"
+        cart.cart_quantity_change(self.offers[0])
+        self.assertEqual(cart.get_products_quantity(), 4)
+        self.assertEqual(cart.get_total_price(), 550)
+
+
+class CartSummaryTest(CartTestCase):
+    """Класс тестирования итогов корзины в сессии"""
+
+    def test_summary_follows_mutations(self):
+        """Итоги обновляются при изменениях корзины и читаются без запросов"""
+        request = self.get_request([2])
+        cart = Cart(request)
+        cart.value = "3"
+        cart.add_to_cart(self.offers[1])
+        cart.value = "-"
+        cart.cart_quantity_change(self.offers[0])
+        self.assertEqual(request.session["cart_summary"], {"quantity": 4, "total_price": "850.00"})
+        cart.delete_from_cart(self.offers[1])
+        with self.assertNumQueries(0):
+            self.assertEqual(Cart(request).summary, {"quantity": 1, "total_price": "100.00"})
+
+    def test_context_processor_is_lazy(self):
+        """Шапка сайта берет итоги из сессии, корзина без обращения не создается"""
+        request = self.get_request([2, 1])
+        context = cart_context(request)
+        Cart(request).save()
+        with self.assertNumQueries(0):
+            header = render_to_string("market/header.jinja2", {**context, "request": request})
+        self.assertIn('<span class="CartBlock-amount">3</span>', header)
+        self.assertIn('<span class="CartBlock-price">450.00$</span>', header)
+        request = self.get_request([])
+        request.session = SessionStore()
+        cart_context(request)
+        self.assertNotIn("cart", request.session)
+
+
+class AuthenticatedCartTestCase(CartTestCase):
+    """Корзина аутентифицированного пользователя"""
+
+    def get_request(self, quantities: dict):
+        request = super().get_request(quantities)
+        request.user = CustomUser.objects.get(username="user_test")
+        return request
+
+    def stored(self) -> dict:
+        return dict(CartItem.objects.filter(cart__user__username="user_test").values_list("offer_id", "quantity"))
+
+
+@override_settings(CART_WRITE_BEHIND=False)
+class CartSaveToDbTest(AuthenticatedCartTestCase):
+    """Класс тестирования сохранения корзины в бд"""
+
+    def test_constant_queries(self):
+        """Количество запросов не зависит от размера корзины"""
+        CartModel.objects.create(user=CustomUser.objects.get(username="user_test"))
+        for quantities in ([1], [1, 2, 3]):
+            CartItem.objects.all().delete()
+            cart = Cart(self.get_request(quantities))
+            cart.snapshot
+            with self.assertNumQueries(5):
+                cart.save_to_db()
+            self.assertEqual(self.stored(), {offer.id: quantity for offer, quantity in zip(self.offers, quantities)})
+
+    def test_delta(self):
+        """В бд записываются только измененные и удаляются убранные из корзины предложения"""
+        cart = Cart(self.get_request([2, 1, 5]))
+        cart.save_to_db()
+        cart.value = "+"
+        cart.cart_quantity_change(self.offers[0])
+        cart.delete_from_cart(self.offers[2])
+        self.assertEqual(self.stored(), {self.offers[0].id: 3, self.offers[1].id: 1})
+        with self.assertNumQueries(2):
+            cart.save_to_db()
+
+
+@override_settings(CART_WRITE_BEHIND=True)
+class CartWriteBehindTest(AuthenticatedCartTestCase):
+    """Класс тестирования отложенной записи корзины в бд"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch.object(persist_cart, "apply_async", side_effect=lambda args, **kwargs: persist_cart(*args))
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_changes_coalesced(self):
+        """Серия изменений записывается в бд одной задачей с последним состоянием корзины"""
+        cart = Cart(self.get_request([2, 1]))
+        with self.captureOnCommitCallbacks() as callbacks:
+            for value in ("+", "+", "-", "+"):
+                cart.value = value
+                cart.cart_quantity_change(self.offers[0])
+            cart.delete_from_cart(self.offers[1])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.stored(), {})
+        callbacks[0]()
+        self.assertEqual(self.apply_async.call_count, 1)
+        self.assertEqual(self.stored(), {self.offers[0].id: 4})
+
+    def test_pending_state_removed(self):
+        """После записи отложенное состояние удаляется, следующее изменение ставит новую задачу"""
+        cart = Cart(self.get_request([2]))
+        user_id = cart.user.id
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.value = "+"
+            cart.cart_quantity_change(self.offers[0])
+        self.assertIsNone(cache.get(PENDING_KEY.format(user_id=user_id)))
+        CartItem.objects.all().delete()
+        flush_pending_cart(user_id)
+        self.assertEqual(self.stored(), {})
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.value = "+"
+            cart.cart_quantity_change(self.offers[0])
+        self.assertEqual(self.apply_async.call_count, 2)
+        self.assertEqual(self.stored(), {self.offers[0].id: 4})
+
+    def test_flush(self):
+        """Синхронная запись при оформлении заказа отменяет отложенную"""
+        cart = Cart(self.get_request([2, 1]))
+        with self.captureOnCommitCallbacks() as callbacks:
+            cart.value = "+"
+            cart.cart_quantity_change(self.offers[0])
+        cart.flush()
+        self.assertEqual(self.stored(), {self.offers[0].id: 3, self.offers[1].id: 1})
+        CartItem.objects.all().delete()
+        callbacks[0]()
+        self.assertEqual(self.stored(), {})
+
+
+@override_settings(CART_WRITE_BEHIND=False)
+class CartPriceSnapshotTest(AuthenticatedCartTestCase):
+    """Класс тестирования снимков цен в сохраненной корзине"""
+
+    def test_total_from_snapshots(self):
+        """Сумма корзины хранится в бд и пересчитывается при изменении корзины"""
+        cart = Cart(self.get_request([2, 1, 5]))
+        cart.save_to_db()
+        self.assertEqual(CartModel.objects.get().total_price, 650)
+        cart.delete_from_cart(self.offers[2])
+        self.assertEqual(CartModel.objects.get().total_price, 450)
+
+    def test_price_change_marks_cart_stale(self):
+        """Изменение цены помечает строки корзин, при проверке обновляются только они"""
+        Cart(self.get_request([2, 1])).save_to_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offers[0].price = 120
+            self.offers[0].save()
+        cart_in_db = CartModel.objects.get()
+        self.assertTrue(cart_in_db.stale)
+        self.assertEqual(
+            list(CartItem.objects.filter(stale=True).values_list("offer_id", flat=True)), [self.offers[0].id]
+        )
+        self.assertEqual(cart_in_db.total_price, 450)
+        with self.assertNumQueries(3):
+            changed = revalidate_cart(cart_in_db)
+        self.assertEqual([line.offer_id for line in changed], [self.offers[0].id])
+        cart_in_db.refresh_from_db()
+        self.assertEqual((cart_in_db.total_price, cart_in_db.stale), (490, False))
+        self.assertFalse(CartItem.objects.filter(stale=True).exists())
+        with self.assertNumQueries(0):
+            self.assertEqual(revalidate_cart(cart_in_db), [])
+
+
+@override_settings(CART_WRITE_BEHIND=False)
+class CartDiscountPriceTest(AuthenticatedCartTestCase):
+    """Страница корзины, шапка и оформление заказа считают сумму по цене со скидкой"""
+
+    def test_cart_page_and_order_agree(self):
+        Offer.objects.filter(pk=self.offers[0].pk).update(discount_price=80)
+        Product.objects.update(preview="products/preview.jpg")
+        user = CustomUser.objects.get(username="user_test")
+        Cart(self.get_request([2, 1])).save_to_db()
+        session = self.client.session
+        session["cart"] = self.get_request([2, 1]).session["cart"]
+        session.save()
+        response = self.client.get("/cart/cart_items/")
+        self.assertContains(response, '<span class="Cart-price" id="cart-total">410.00</span>')
+        self.assertContains(response, "160.00$")
+        self.assertContains(response, '<span class="CartBlock-price">410.00$</span>')
+        order = pryce_delivery(user)
+        self.assertEqual(order["total_cost_ordinary"] - order["delivery_ordinary"], 410)
+
+
+@override_settings(CART_WRITE_BEHIND=False)
+class CartMergeTest(AuthenticatedCartTestCase):
+    """Класс тестирования объединения корзин при входе"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_merge_quantities(self):
+        in_session, stored = {1: 2, 2: 1}, {2: 3, 3: 1}
+        self.assertEqual(merge_quantities(in_session, stored, "sum"), {1: 2, 2: 4, 3: 1})
+        self.assertEqual(merge_quantities(in_session, stored, "max"), {1: 2, 2: 3, 3: 1})
+        self.assertEqual(merge_quantities(in_session, stored, "session"), {1: 2, 2: 1, 3: 1})
+        self.assertEqual(merge_quantities(in_session, stored, "db"), {1: 2, 2: 3, 3: 1})
+
+    def test_merge_on_login(self):
+        """Корзины сессии и бд объединяются, результат записывается в обе"""
+        Cart(self.get_request([1, 3, 1])).save_to_db()
+        request = self.get_request([2, 1])
+        with self.assertNumQueries(9):
+            Cart(request).merge_on_login()
+        expected = {self.offers[0].id: 3, self.offers[1].id: 4, self.offers[2].id: 1}
+        self.assertEqual(self.stored(), expected)
+        self.assertEqual({int(key): item["quantity"] for key, item in request.session["cart"].items()}, expected)
+        self.assertEqual(request.session["cart_summary"]["quantity"], 8)
+
+    def test_repeat_login(self):
+        """Повторный вход в той же сессии не удваивает количество, новая сессия объединяется как обычно"""
+        Cart(self.get_request([1, 3])).save_to_db()
+        request = self.get_request([2])
+        for _ in range(2):
+            Cart(request).merge_on_login()
+            self.assertEqual(self.stored(), {self.offers[0].id: 3, self.offers[1].id: 3})
+            self.assertEqual(request.session["cart"][str(self.offers[0].id)]["quantity"], 3)
+        Cart(self.get_request([1])).merge_on_login()
+        self.assertEqual(self.stored(), {self.offers[0].id: 4, self.offers[1].id: 3})
+
+    def test_pending_state_merged(self):
+        """Отложенное состояние корзины новее бд и участвует в объединении"""
+        Cart(self.get_request([1])).save_to_db()
+        with override_settings(CART_WRITE_BEHIND=True), self.captureOnCommitCallbacks():
+            cart = Cart(self.get_request([5]))
+            cart.value = "+"
+            cart.cart_quantity_change(self.offers[0])
+        request = self.get_request([])
+        Cart(request).merge_on_login()
+        self.assertEqual(self.stored(), {self.offers[0].id: 6})
+        self.assertEqual(request.session["cart"][str(self.offers[0].id)]["quantity"], 6)
+
+
+class CartSweeperTest(CartTestCase):
+    """Класс тестирования очистки заброшенных корзин"""
+
+    def test_sweep_in_batches(self):
+        """Удаляются только корзины без изменений дольше заданного срока, итоги уходят в сигнал"""
+        user = CustomUser.objects.get(username="user_test")
+        carts = [CartModel.objects.create(user=user) for _ in range(5)]
+        for cart in carts:
+            CartItem.objects.create(cart=cart, offer=self.offers[0])
+        CartModel.objects.filter(pk__in=[cart.pk for cart in carts[:3]]).update(
+            updated_at=timezone.now() - timedelta(days=31)
+        )
+        reports = []
+
+        def receiver(sender, **kwargs):
+            reports.append(kwargs)
+
+        carts_swept.connect(receiver)
+        self.addCleanup(carts_swept.disconnect, receiver)
+        totals = sweep_abandoned_carts(idle_days=30, batch_size=2)
+        self.assertEqual(totals, {"carts": 3, "items": 3, "batches": 2})
+        self.assertEqual(reports[0]["carts"], 3)
+        self.assertEqual(set(CartModel.objects.values_list("pk", flat=True)), {cart.pk for cart in carts[3:]})
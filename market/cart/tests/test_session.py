@@ -0,0 +1,41 @@
+import msgpack
+from django.core import signing
+from django.test import SimpleTestCase
+
+from config.session_serializer import MsgPackSerializer
+
+
+class MsgPackSerializerTest(SimpleTestCase):
+    """Класс тестирования сериализатора сессии"""
+
+    session = {
+        "_auth_user_id": "1",
+        "cart": {
+            "12": {"quantity": 2, "created_at": 1690884000},
+            "7": {"quantity": 1, "created_at": '"2023-08-01 10:00:00"'},
+        },
+        "cart_summary": {"quantity": 3, "total_price": "650.00"},
+        "comp_list": ["12", "7"],
+        "filter": {"price": "5000;20000", "name": "", "in_stock": True, "free_delivery": False},
+        "search": "ноутбук",
+    }
+
+    def test_round_trip(self):
+        """Сессия читается в том же виде, в каком записана"""
+        data = MsgPackSerializer().dumps(self.session)
+        self.assertEqual(MsgPackSerializer().loads(data), self.session)
+        self.assertLess(len(data), len(signing.JSONSerializer().dumps(self.session)))
+
+    def test_compact_keys(self):
+        """Корзина хранится плоским списком, id в списке сравнения - числами"""
+        packed = msgpack.unpackb(MsgPackSerializer().dumps(self.session))
+        self.assertEqual(packed["cart"], [12, 2, 1690884000, 7, 1, '"2023-08-01 10:00:00"'])
+        self.assertEqual(packed["comp_list"], [12, 7])
+
+    def test_legacy_json(self):
+        """Сессии в прежнем формате JSON читаются"""
+        data = signing.JSONSerializer().dumps(self.session)
+        self.assertEqual(MsgPackSerializer().loads(data), self.session)
+        salt = "django.contrib.sessions.SessionStore"
+        encoded = signing.dumps(self.session, salt=salt, compress=True)
+        self.assertEqual(signing.loads(encoded, salt=salt, serializer=MsgPackSerializer), self.session)
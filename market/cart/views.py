@@ -1,5 +1,9 @@
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.views.generic import TemplateView
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from shops.models import Offer
 from cart.cart import Cart as CartServices
@@ -13,6 +17,7 @@ class CartView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         cart = CartServices(self.request)
+        cart.update_summary()
         context["cart"] = cart
         return context
 
@@ -34,3 +39,56 @@ def delete_item_from_cart(request, pk):
     offer = get_object_or_404(Offer, id=pk)
     cart.delete_from_cart(offer=offer)
     return redirect(request.META.get("HTTP_REFERER"))
+
+
+class CartItemAPI(APIView):
+    """
+    Изменение строки корзины без перезагрузки страницы.
+    В ответе только измененная строка, итоги корзины и количество товаров для шапки
+    """
+
+    def post(self, request, pk):
+        """Добавление предложения в корзину, quantity - количество"""
+        quantity = str(request.data.get("quantity", 1))
+        if not quantity.isdecimal() or int(quantity) < 1:
+            return Response({"error": "quantity"}, status=status.HTTP_400_BAD_REQUEST)
+        cart = CartServices(request)
+        cart.value = quantity
+        cart.add_to_cart(offer=get_object_or_404(Offer.objects.only("id"), id=pk))
+        return self.line_response(cart, pk)
+
+    def patch(self, request, pk):
+        """Изменение количества: value - "+", "-" или число, которое прибавляется к количеству"""
+        value = str(request.data.get("value", ""))
+        if value not in ("+", "-") and not value.isdecimal():
+            return Response({"error": "value"}, status=status.HTTP_400_BAD_REQUEST)
+        cart = self.get_cart(request, pk)
+        cart.value = value
+        cart.cart_quantity_change(Offer(id=pk))
+        return self.line_response(cart, pk)
+
+    def delete(self, request, pk):
+        """Удаление предложения из корзины"""
+        cart = self.get_cart(request, pk)
+        cart.delete_from_cart(Offer(id=pk))
+        return self.line_response(cart, pk)
+
+    @staticmethod
+    def get_cart(request, pk) -> CartServices:
+        cart = CartServices(request)
+        if str(pk) not in cart.cart:
+            raise Http404
+        return cart
+
+    @staticmethod
+    def line_response(cart: CartServices, pk: int) -> Response:
+        """Строка корзины по снимку предложений и итоги из сессии"""
+        line = next((item for item in cart if item["offer"].id == pk), None)
+        return Response(
+            {
+                "offer": pk,
+                "quantity": line["quantity"] if line else 0,
+                "subtotal": str(line["price"] * line["quantity"]) if line else "0",
+                "cart": cart.summary,
+            }
+        )
@@ -1,24 +1,133 @@
+import hashlib
+import json
+import threading
+from functools import wraps
+
 from django.conf import settings
 from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+from django.utils.cache import _generate_cache_header_key, get_cache_key
+from django.views.decorators.cache import cache_page
+from django_redis import get_redis_connection
+
+TAG_KEY = "cache.tag.{tag}"
+CATEGORIES_FRAGMENT = "categories"
+GENERATION_KEY = "catalog.generation.{namespace}"
+RESULT_KEY = "catalog.result.{namespace}.{generation}.{digest}"
+GLOBAL_NAMESPACE = "all"
+
+_local = threading.local()
+
+
+class InvalidationBatch:
+    """Сбросы кэша, накопленные внутри блока atomic. Выполняются один раз после фиксации транзакции"""
+
+    def __init__(self, savepoints: list = None):
+        self.savepoints = savepoints or []
+        self.tags = set()
+        self.keys = set()
+        self.slugs = None
+        self.flushed = False
+
+    def add(self, tags=(), keys=(), slugs=None) -> None:
+        self.tags.update(tags)
+        self.keys.update(keys)
+        if slugs is not None:
+            self.slugs = (self.slugs or set()) | set(filter(None, slugs))
+
+    def __call__(self):
+        self.flushed = True
+        keys = set(self.keys)
+        if self.tags:
+            tag_keys = [cache.make_key(TAG_KEY.format(tag=tag)) for tag in self.tags]
+            pipeline = get_redis_connection("default").pipeline()
+            for tag_key in tag_keys:
+                pipeline.smembers(tag_key)
+            pipeline.delete(*tag_keys)
+            for members in pipeline.execute()[:-1]:
+                keys.update(member.decode() for member in members)
+        if keys:
+            cache.delete_many(list(keys))
+        if self.slugs is not None:
+            for namespace in {GLOBAL_NAMESPACE, *self.slugs}:
+                key = GENERATION_KEY.format(namespace=namespace)
+                if not cache.add(key, 2, None):
+                    cache.incr(key)
+
+
+def invalidate(tags=(), keys=(), slugs=None) -> None:
+    """Сброс ключей по тегам и явных ключей, увеличение поколений категорий.
+    Внутри транзакции сбросы объединяются и выполняются один раз в on_commit"""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        batch = InvalidationBatch()
+        batch.add(tags, keys, slugs)
+        return batch()
+    batch = getattr(_local, "batch", None)
+    if (
+        batch is None
+        or batch.flushed
+        or batch.savepoints != connection.savepoint_ids
+        or not any(callback is batch for _, callback, *_ in connection.run_on_commit)
+    ):
+        batch = _local.batch = InvalidationBatch(list(connection.savepoint_ids))
+        transaction.on_commit(batch)
+    batch.add(tags, keys, slugs)
+
+
+def tag_keys(tag: str, *keys: str, timeout: int = settings.CACHE_TIME_PER_DAY) -> None:
+    """Запоминает ключи кэша в множестве тега, чтобы сбросить их без сканирования KEYS"""
+    tag_key = cache.make_key(TAG_KEY.format(tag=tag))
+    pipeline = get_redis_connection("default").pipeline()
+    pipeline.sadd(tag_key, *keys)
+    pipeline.expire(tag_key, timeout)
+    pipeline.execute()
+
+
+def tagged_cache_page(timeout: int, key_prefix: str):
+    """cache_page, который запоминает ключи закэшированных страниц в теге key_prefix"""
+
+    def decorator(view):
+        cached_view = cache_page(timeout, key_prefix=key_prefix)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = cached_view(request, *args, **kwargs)
+            if getattr(request, "_cache_update_cache", False):
+                page_key = get_cache_key(request, key_prefix, request.method, cache=cache)
+                if page_key:
+                    tag_keys(key_prefix, page_key, _generate_cache_header_key(key_prefix, request), timeout=timeout)
+            return response
+
+        return wrapper
+
+    return decorator
 
 
 def clear_cache_catalog():
     """Очищает весь кэш Catalog"""
-    key_prefix = "catalog"
-    select_keys = cache.keys(
-        f"views.decorators.cache.cache_header.{key_prefix}.*.{settings.LANGUAGE_CODE}.{settings.TIME_ZONE}"
-    )
-    select_keys_get = cache.keys(
-        f"views.decorators.cache.cache_page.{key_prefix}.GET.*.{settings.LANGUAGE_CODE}.{settings.TIME_ZONE}"
-    )
-    select_cache = cache.get_many(select_keys)
-    select_cache_get = cache.get_many(select_keys_get)
-    cache.delete_many(select_cache)
-    cache.delete_many(select_cache_get)
+    invalidate(tags=["catalog"])
 
 
 def clear_cache_category():
     """Сброс кэша для категорий"""
-    select_keys = cache.keys("template.cache.<QuerySet *.*")
-    select_cache_get = cache.get_many(select_keys)
-    cache.delete_many(select_cache_get)
+    invalidate(keys=[make_template_fragment_key(CATEGORIES_FRAGMENT)])
+
+
+def generation(namespace: str = GLOBAL_NAMESPACE) -> int:
+    """Текущее поколение пространства имен кэша каталога"""
+    return cache.get_or_set(GENERATION_KEY.format(namespace=namespace), 1, None)
+
+
+def bump_generations(slugs=()) -> None:
+    """Сброс кэша результатов каталога увеличением поколений: общего и категорий с указанными slug.
+    Старые ключи не удаляются, а перестают читаться и истекают сами"""
+    invalidate(slugs=slugs)
+
+
+def result_key(slug: str = None, **params) -> str:
+    """Ключ кэша результатов каталога по нормализованным параметрам запроса в пространстве имен категории"""
+    namespace = slug or GLOBAL_NAMESPACE
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return RESULT_KEY.format(namespace=namespace, generation=generation(namespace), digest=digest)
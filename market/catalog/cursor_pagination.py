@@ -0,0 +1,85 @@
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+COUNT_KEY = "catalog.cursor_count.{digest}"
+
+
+def encode_cursor(sort: str, values: list) -> str:
+    """Непрозрачный токен курсора: сортировка и значения ключей последнего объекта страницы"""
+    payload = json.dumps({"sort": sort, "values": [str(value) for value in values]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort: str) -> list or None:
+    """Разбор токена курсора. Токен другой сортировки или поврежденный токен означает первую страницу"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict) or payload.get("sort") != sort:
+        return None
+    return payload.get("values")
+
+
+def after_cursor(keys: list, values: list) -> Q:
+    """Условие 'строго после курсора' для лексикографического порядка по ключам"""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        condition |= equal & Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+class CursorPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, object_list: list, next_cursor: str or None, count: int or None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+class CursorPaginator:
+    """Курсорная (keyset) пагинация по ключам сортировки (поле, по убыванию).
+    Последним ключом должен быть pk, чтобы порядок был однозначным.
+    OFFSET и COUNT(*) не выполняются, поэтому любая страница стоит столько же, сколько первая"""
+
+    def __init__(self, queryset, per_page: int, keys: list, sort: str = "", with_count: bool = False):
+        self.keys = keys
+        self.queryset = queryset.order_by(*(f"-{field}" if descending else field for field, descending in keys))
+        self.per_page = per_page
+        self.sort = sort
+        self.with_count = with_count
+
+    def get_page(self, cursor: str = None) -> CursorPage:
+        queryset = self.queryset
+        values = decode_cursor(cursor, self.sort) if cursor else None
+        if values and len(values) == len(self.keys):
+            queryset = queryset.filter(after_cursor(self.keys, values))
+        object_list = list(queryset[: self.per_page + 1])
+        next_cursor = None
+        if len(object_list) > self.per_page:
+            object_list = object_list[: self.per_page]
+            next_cursor = encode_cursor(self.sort, [getattr(object_list[-1], field) for field, _ in self.keys])
+        return CursorPage(object_list, next_cursor, self.estimated_count() if self.with_count else None)
+
+    def estimated_count(self) -> int:
+        """Общее количество объектов, кэшируемое по тексту запроса на CACHE_CONSTANT секунд"""
+        queryset = self.queryset.order_by()
+        digest = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return cache.get_or_set(COUNT_KEY.format(digest=digest), queryset.count, settings.CACHE_CONSTANT)
@@ -0,0 +1,94 @@
+import random
+import re
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Avg
+from django.test.utils import CaptureQueriesContext
+
+from catalog.price_and_discounts import refresh_price_summaries
+from catalog.product_filter import ProductFilter
+from products.models import Product
+from shops.models import Offer, Shop
+from users.models import CustomUser
+
+BATCH_SIZE = 5000
+PLAN_COST = re.compile(r"cost=[\d.]+\.\.([\d.]+)")
+
+
+class Command(BaseCommand):
+    """Сравнение фильтра каталога с прежней цепочкой join по предложениям на заполненном каталоге"""
+
+    help = "Заполняет каталог тестовыми продуктами и выводит количество запросов и стоимость плана фильтра"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000, help="Количество тестовых продуктов")
+        parser.add_argument("--offers", type=int, default=3, help="Предложений на продукт")
+        parser.add_argument("--keep", action="store_true", help="Не откатывать тестовые данные")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options["products"], options["offers"])
+            data = {"price": "5000;20000", "name": "ноутбук 1", "in_stock": True, "free_delivery": True}
+            self.report("ProductFilter", ProductFilter.from_data(data)(Product.objects.all()))
+            self.report("join + distinct", self.legacy_filter(data))
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def seed(self, count: int, offers_per_product: int) -> None:
+        """Создание продуктов, предложений и сводных цен пачками"""
+        shop = Shop.objects.first()
+        if shop is None:
+            user = CustomUser.objects.create(email="benchmark@example.com", username="benchmark")
+            shop = Shop.objects.create(name="benchmark", user=user, phone_number="0", email=user.email)
+        started = time.monotonic()
+        for start in range(0, count, BATCH_SIZE):
+            products = Product.objects.bulk_create(
+                Product(name=f"{random.choice(('ноутбук', 'телефон', 'чайник'))} {number}")
+                for number in range(start, min(start + BATCH_SIZE, count))
+            )
+            Offer.objects.bulk_create(
+                Offer(
+                    shop=shop,
+                    product=product,
+                    price=price,
+                    discount_price=price,
+                    product_in_stock=random.random() < 0.7,
+                    free_shipping=random.random() < 0.3,
+                )
+                for product in products
+                for price in (Decimal(random.randint(1000, 50000)) for _ in range(offers_per_product))
+            )
+            refresh_price_summaries(product.id for product in products)
+        self.stdout.write(f"Создано продуктов: {count} за {time.monotonic() - started:.1f} с")
+
+    @staticmethod
+    def legacy_filter(data: dict):
+        """Фильтр в прежнем виде: агрегат и условия по join с предложениями"""
+        price_from, price_to = ProductFilter.parse_price(data["price"])
+        return (
+            Product.objects.annotate(discount=Avg("offers__discount_price"))
+            .filter(
+                name__icontains=data["name"],
+                discount__range=(price_from, price_to),
+                offers__product_in_stock=True,
+                offers__free_shipping=True,
+            )
+            .distinct()
+        )
+
+    def report(self, title: str, products) -> None:
+        """Вывод количества запросов, времени и стоимости плана"""
+        started = time.monotonic()
+        with CaptureQueriesContext(connection) as queries:
+            found = products.count()
+            list(products.order_by("id")[:20])
+        elapsed = (time.monotonic() - started) * 1000
+        plan = products.explain()
+        cost = PLAN_COST.search(plan)
+        self.stdout.write(
+            f"{title}: найдено {found}, запросов {len(queries)}, {elapsed:.1f} мс, "
+            f"стоимость плана {cost.group(1) if cost else plan.splitlines()[0]}"
+        )
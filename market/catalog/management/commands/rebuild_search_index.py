@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    """Полный пересчет поискового индекса продуктов"""
+
+    help = "Пересчитывает поисковые документы всех продуктов"
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано продуктов: {count}"))
@@ -0,0 +1,104 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:40
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min, Q
+import django.db.models.deletion
+
+
+def fill_price_summaries(apps, schema_editor):
+    Offer = apps.get_model("shops", "Offer")
+    ProductPriceSummary = apps.get_model("catalog", "ProductPriceSummary")
+    rows = (
+        Offer.objects.values("product_id")
+        .annotate(
+            category_id=Min("product__category_id"),
+            min_price=Min("discount_price"),
+            avg_price=Avg("discount_price"),
+            max_price=Max("discount_price"),
+            offer_count=Count("id"),
+            in_stock_count=Count("id", filter=Q(product_in_stock=True)),
+            free_shipping_count=Count("id", filter=Q(free_shipping=True)),
+            newest_offer_date=Max("date_of_creation"),
+        )
+        .order_by()
+    )
+    ProductPriceSummary.objects.bulk_create(
+        [
+            ProductPriceSummary(
+                product_id=row["product_id"],
+                category_id=row["category_id"],
+                min_price=row["min_price"],
+                avg_price=row["avg_price"],
+                max_price=row["max_price"],
+                offer_count=row["offer_count"],
+                in_stock=row["in_stock_count"] > 0,
+                free_shipping=row["free_shipping_count"] > 0,
+                newest_offer_date=row["newest_offer_date"],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0001_initial"),
+        ("catalog", "0001_initial"),
+        ("shops", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductPriceSummary",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="price_summary",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="продукт",
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name="минимальная цена со скидкой"),
+                ),
+                (
+                    "avg_price",
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name="средняя цена со скидкой"),
+                ),
+                (
+                    "max_price",
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name="максимальная цена со скидкой"),
+                ),
+                ("offer_count", models.PositiveIntegerField(verbose_name="количество предложений")),
+                ("in_stock", models.BooleanField(verbose_name="есть в наличии")),
+                ("free_shipping", models.BooleanField(verbose_name="есть бесплатная доставка")),
+                ("newest_offer_date", models.DateTimeField(verbose_name="дата последнего предложения")),
+                (
+                    "category",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="price_summaries",
+                        to="catalog.catalog",
+                        verbose_name="категория",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "сводная цена продукта",
+                "verbose_name_plural": "сводные цены продуктов",
+                "indexes": [
+                    models.Index(fields=["avg_price"], name="catalog_pro_avg_pri_8bceb1_idx"),
+                    models.Index(fields=["category", "avg_price"], name="catalog_pro_categor_be029d_idx"),
+                    models.Index(fields=["newest_offer_date"], name="catalog_pro_newest__9f6680_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_price_summaries, migrations.RunPython.noop),
+    ]
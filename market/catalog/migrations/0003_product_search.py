@@ -0,0 +1,145 @@
+# Generated by Django 4.2.1 on 2026-10-18 18:53
+
+import re
+from collections import defaultdict
+from functools import reduce
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_vector_index(apps, schema_editor):
+    """GIN индекс по поисковому вектору доступен только на PostgreSQL"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS catalog_productsearchdocument_vector_gin "
+            "ON catalog_productsearchdocument USING gin (vector)"
+        )
+
+
+def drop_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS catalog_productsearchdocument_vector_gin")
+
+
+BATCH_SIZE = 500
+TOKEN = re.compile(r"\w+")
+FIELD_WEIGHTS = {"name": ("A", 1.0), "tags": ("B", 0.6), "properties": ("C", 0.4), "description": ("D", 0.2)}
+
+
+def fill_search_index(apps, schema_editor):
+    """Поисковые документы и индекс терминов для уже существующих продуктов"""
+    Product = apps.get_model("products", "Product")
+    ProductProperty = apps.get_model("products", "ProductProperty")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    ProductSearchDocument = apps.get_model("catalog", "ProductSearchDocument")
+    ProductSearchTerm = apps.get_model("catalog", "ProductSearchTerm")
+    content_type = ContentType.objects.filter(app_label="products", model="product").first()
+    product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+    while product_ids:
+        chunk, product_ids = product_ids[:BATCH_SIZE], product_ids[BATCH_SIZE:]
+        tags, properties = defaultdict(list), defaultdict(list)
+        if content_type is not None:
+            for product_id, tag in TaggedItem.objects.filter(
+                content_type=content_type, object_id__in=chunk
+            ).values_list("object_id", "tag__name"):
+                tags[product_id].append(tag)
+        for product_id, value in ProductProperty.objects.filter(product_id__in=chunk).values_list(
+            "product_id", "value"
+        ):
+            properties[product_id].append(value)
+        documents = ProductSearchDocument.objects.bulk_create(
+            ProductSearchDocument(
+                product_id=product.pk,
+                name=product.name,
+                tags=" ".join(tags[product.pk]),
+                properties=" ".join(properties[product.pk]),
+                description=product.description,
+            )
+            for product in Product.objects.filter(pk__in=chunk)
+        )
+        if schema_editor.connection.vendor == "postgresql":
+            from django.contrib.postgres.search import SearchVector
+
+            vector = reduce(
+                lambda left, right: left + right,
+                (SearchVector(field, weight=weight, config="russian") for field, (weight, _) in FIELD_WEIGHTS.items()),
+            )
+            ProductSearchDocument.objects.filter(product_id__in=chunk).update(vector=vector)
+            continue
+        terms = []
+        for document in documents:
+            weights = {}
+            for field, (_, weight) in FIELD_WEIGHTS.items():
+                for term in set(token[:64] for token in TOKEN.findall((getattr(document, field) or "").lower())):
+                    weights[term] = weights.get(term, 0) + weight
+            terms += [
+                ProductSearchTerm(product_id=document.product_id, term=term, weight=weight)
+                for term, weight in weights.items()
+            ]
+        ProductSearchTerm.objects.bulk_create(terms, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0002_product_name_trigram_index"),
+        ("taggit", "0005_auto_20220424_2025"),
+        ("catalog", "0002_productpricesummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="продукт",
+                    ),
+                ),
+                ("name", models.TextField(verbose_name="наименование")),
+                ("tags", models.TextField(blank=True, verbose_name="тэги")),
+                ("properties", models.TextField(blank=True, verbose_name="значения свойств")),
+                ("description", models.TextField(blank=True, verbose_name="описание")),
+                (
+                    "vector",
+                    django.contrib.postgres.search.SearchVectorField(null=True, verbose_name="поисковый вектор"),
+                ),
+            ],
+            options={
+                "verbose_name": "поисковый документ продукта",
+                "verbose_name_plural": "поисковые документы продуктов",
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductSearchTerm",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("term", models.CharField(max_length=64, verbose_name="термин")),
+                ("weight", models.FloatField(verbose_name="вес")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="products.product",
+                        verbose_name="продукт",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "термин поискового индекса",
+                "verbose_name_plural": "термины поискового индекса",
+                "unique_together": {("term", "product")},
+            },
+        ),
+        migrations.RunPython(create_vector_index, drop_vector_index),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
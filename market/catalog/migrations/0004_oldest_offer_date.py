@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-18 21:14
+
+from django.db import migrations, models
+from django.db.models import Min, OuterRef, Subquery
+
+
+def fill_oldest_offer_date(apps, schema_editor):
+    Offer = apps.get_model("shops", "Offer")
+    ProductPriceSummary = apps.get_model("catalog", "ProductPriceSummary")
+    oldest = (
+        Offer.objects.filter(product_id=OuterRef("product_id"))
+        .order_by()
+        .values("product_id")
+        .annotate(date=Min("date_of_creation"))
+        .values("date")
+    )
+    ProductPriceSummary.objects.update(oldest_offer_date=Subquery(oldest))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shops", "0001_initial"),
+        ("catalog", "0003_product_search"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="productpricesummary",
+            name="catalog_pro_newest__9f6680_idx",
+        ),
+        migrations.RenameField(
+            model_name="productpricesummary",
+            old_name="newest_offer_date",
+            new_name="oldest_offer_date",
+        ),
+        migrations.AlterField(
+            model_name="productpricesummary",
+            name="oldest_offer_date",
+            field=models.DateTimeField(verbose_name="дата первого предложения"),
+        ),
+        migrations.AddIndex(
+            model_name="productpricesummary",
+            index=models.Index(fields=["oldest_offer_date"], name="catalog_pro_oldest__dd4a1f_idx"),
+        ),
+        migrations.RunPython(fill_oldest_offer_date, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
 from catalog import utilites
-from catalog.cache_for_catalog import clear_cache_category
+from catalog.cache_for_catalog import bump_generations, clear_cache_category
 
 
 class Catalog(models.Model):
@@ -19,9 +20,12 @@ class Catalog(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
+        old_slug = Catalog.objects.filter(pk=self.pk).values_list("slug", flat=True).first() if self.pk else None
         self.slug = utilites.get_slug(self.name)
         clear_cache_category()
-        return super().save(*args, **kwargs)
+        result = super().save(*args, **kwargs)
+        bump_generations([old_slug, self.slug])
+        return result
 
     def get_absolute_url(self):
         return reverse("catalog:catalog-category", kwargs={"slug": self.slug})
@@ -32,3 +36,77 @@ class Catalog(models.Model):
         ordering = [
             "name",
         ]
+
+
+class ProductPriceSummary(models.Model):
+    """Сводные цены и признаки предложений продукта для фильтрации и сортировки каталога"""
+
+    product = models.OneToOneField(
+        "products.Product",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="price_summary",
+        verbose_name=_("продукт"),
+    )
+    category = models.ForeignKey(
+        Catalog,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name="price_summaries",
+        verbose_name=_("категория"),
+    )
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("минимальная цена со скидкой"))
+    avg_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("средняя цена со скидкой"))
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("максимальная цена со скидкой"))
+    offer_count = models.PositiveIntegerField(verbose_name=_("количество предложений"))
+    in_stock = models.BooleanField(verbose_name=_("есть в наличии"))
+    free_shipping = models.BooleanField(verbose_name=_("есть бесплатная доставка"))
+    oldest_offer_date = models.DateTimeField(verbose_name=_("дата первого предложения"))
+
+    class Meta:
+        verbose_name = _("сводная цена продукта")
+        verbose_name_plural = _("сводные цены продуктов")
+        indexes = [
+            models.Index(fields=["avg_price"]),
+            models.Index(fields=["category", "avg_price"]),
+            models.Index(fields=["oldest_offer_date"]),
+        ]
+
+
+class ProductSearchDocument(models.Model):
+    """Поисковый документ продукта: тексты полей, по которым ищется продукт, и tsvector для PostgreSQL"""
+
+    product = models.OneToOneField(
+        "products.Product",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+        verbose_name=_("продукт"),
+    )
+    name = models.TextField(verbose_name=_("наименование"))
+    tags = models.TextField(blank=True, verbose_name=_("тэги"))
+    properties = models.TextField(blank=True, verbose_name=_("значения свойств"))
+    description = models.TextField(blank=True, verbose_name=_("описание"))
+    vector = SearchVectorField(null=True, verbose_name=_("поисковый вектор"))
+
+    class Meta:
+        verbose_name = _("поисковый документ продукта")
+        verbose_name_plural = _("поисковые документы продуктов")
+
+
+class ProductSearchTerm(models.Model):
+    """Запись инвертированного индекса: термин поискового документа и его вес. Используется вне PostgreSQL"""
+
+    product = models.ForeignKey(
+        "products.Product",
+        on_delete=models.CASCADE,
+        related_name="search_terms",
+        verbose_name=_("продукт"),
+    )
+    term = models.CharField(max_length=64, verbose_name=_("термин"))
+    weight = models.FloatField(verbose_name=_("вес"))
+
+    class Meta:
+        verbose_name = _("термин поискового индекса")
+        verbose_name_plural = _("термины поискового индекса")
+        unique_together = (("term", "product"),)
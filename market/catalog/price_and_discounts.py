@@ -1,35 +1,137 @@
-from django.db.models import Min, Max, Avg
-from products.models import Product
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Max, Avg, Count, Q
+
+from catalog.cache_for_catalog import bump_generations
+from catalog.models import Catalog, ProductPriceSummary
+from shops.models import Offer
+
+PRICE_BOUNDS_KEY = "catalog.price_bounds.{scope}"
+GLOBAL_SCOPE = "all"
+CENTS = Decimal("0.01")
+
+SUMMARY_FIELDS = (
+    "category",
+    "min_price",
+    "avg_price",
+    "max_price",
+    "offer_count",
+    "in_stock",
+    "free_shipping",
+    "oldest_offer_date",
+)
+
+# Поля сводной цены, от которых зависят страницы каталога в кэше результатов
+CATALOG_FIELDS = ("category_id", "avg_price", "in_stock", "free_shipping", "oldest_offer_date")
+
+
+def price_bounds(slug: str = None) -> (int, int):
+    """Границы слайдера цены для всего каталога или для категории.
+    Значения хранятся в кэше и сбрасываются только при изменении сводных цен в этой области"""
+    key = PRICE_BOUNDS_KEY.format(scope=slug or GLOBAL_SCOPE)
+    bounds = cache.get(key)
+    if bounds is None:
+        summaries = ProductPriceSummary.objects.all()
+        if slug:
+            summaries = summaries.filter(category__slug=slug)
+        price = summaries.aggregate(Min("avg_price"), Max("avg_price"))
+        bounds = round(price["avg_price__min"] or 0), round(price["avg_price__max"] or 0)
+        cache.set(key, bounds, settings.CACHE_TIME_PER_DAY)
+    return bounds
+
+
+def invalidate_price_bounds(category_ids) -> None:
+    """Сброс кэша границ цены и поколений кэша результатов для всего каталога и для указанных категорий"""
+    slugs = list(Catalog.objects.filter(id__in=category_ids).values_list("slug", flat=True))
+    cache.delete_many([PRICE_BOUNDS_KEY.format(scope=scope) for scope in (GLOBAL_SCOPE, *slugs)])
+    bump_generations(slugs)
 
 
 def min_price() -> int:
-    products = Product.objects.all()
-    price = products.annotate(price_min_discount=Avg("offers__discount_price")).aggregate(Min("price_min_discount"))
-    return round(price["price_min_discount__min"] or 0)
+    return price_bounds()[0]
 
 
 def max_price() -> int:
-    products = Product.objects.all()
-    price = products.annotate(price_max_discount=Avg("offers__discount_price")).aggregate(Max("price_max_discount"))
-    return round(price["price_max_discount__max"] or 0)
+    return price_bounds()[1]
 
 
 def min_price_for_category(slug: str) -> int:
-    products = Product.objects.filter(category__slug=slug)
-    price = products.annotate(price_min_discount=Avg("offers__discount_price")).aggregate(Min("price_min_discount"))
-    return round(price["price_min_discount__min"] or 0)
+    return price_bounds(slug)[0]
 
 
 def max_price_for_category(slug: str) -> int:
-    products = Product.objects.filter(category__slug=slug)
-    price = products.annotate(price_max_discount=Avg("offers__discount_price")).aggregate(Max("price_max_discount"))
-    return round(price["price_max_discount__max"] or 0)
-
-
-def check_discount_price():
-    """Обновление цены со скидкой"""
-    products = Product.objects.all()
-    for product in products:
-        for ii in product.offers.only("discount_price"):
-            ii.discount_price = ii.price_with_discount
-            ii.save()
+    return price_bounds(slug)[1]
+
+
+def refresh_price_summaries(product_ids) -> None:
+    """Пересчет сводных цен для продуктов одним агрегирующим запросом.
+    Сводные цены продуктов без предложений удаляются.
+    Кэш категорий сбрасывается, если изменились поля, по которым каталог фильтрует и сортирует продукты"""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    previous = {
+        product_id: values
+        for product_id, *values in ProductPriceSummary.objects.filter(product_id__in=product_ids).values_list(
+            "product_id", *CATALOG_FIELDS
+        )
+    }
+    rows = (
+        Offer.objects.filter(product_id__in=product_ids)
+        .values("product_id")
+        .annotate(
+            category_id=Min("product__category_id"),
+            min_price=Min("discount_price"),
+            avg_price=Avg("discount_price"),
+            max_price=Max("discount_price"),
+            offer_count=Count("id"),
+            in_stock_count=Count("id", filter=Q(product_in_stock=True)),
+            free_shipping_count=Count("id", filter=Q(free_shipping=True)),
+            oldest_offer_date=Min("date_of_creation"),
+        )
+        .order_by()
+    )
+    summaries = [
+        ProductPriceSummary(
+            product_id=row["product_id"],
+            category_id=row["category_id"],
+            min_price=row["min_price"],
+            avg_price=Decimal(row["avg_price"]).quantize(CENTS),
+            max_price=row["max_price"],
+            offer_count=row["offer_count"],
+            in_stock=row["in_stock_count"] > 0,
+            free_shipping=row["free_shipping_count"] > 0,
+            oldest_offer_date=row["oldest_offer_date"],
+        )
+        for row in rows
+    ]
+    ProductPriceSummary.objects.bulk_create(
+        summaries, update_conflicts=True, unique_fields=["product"], update_fields=SUMMARY_FIELDS
+    )
+    deleted = product_ids - {summary.product_id for summary in summaries}
+    ProductPriceSummary.objects.filter(product_id__in=deleted).delete()
+    changed = [
+        summary
+        for summary in summaries
+        if previous.get(summary.product_id) != [getattr(summary, field) for field in CATALOG_FIELDS]
+    ]
+    category_ids = {summary.category_id for summary in changed}
+    category_ids.update(
+        previous[product_id][0]
+        for product_id in deleted | {summary.product_id for summary in changed}
+        if product_id in previous
+    )
+    if category_ids:
+        invalidate_price_bounds(category_ids - {None})
+
+
+def delete_empty_price_summaries() -> None:
+    """Удаление сводных цен продуктов, у которых не осталось предложений"""
+    category_ids = set(
+        ProductPriceSummary.objects.filter(product__offers__isnull=True).values_list("category_id", flat=True)
+    )
+    if category_ids:
+        ProductPriceSummary.objects.filter(product__offers__isnull=True).delete()
+        invalidate_price_bounds(category_ids - {None})
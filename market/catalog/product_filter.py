@@ -0,0 +1,72 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Exists, OuterRef, Q
+
+from shops.models import Offer
+
+
+class ProductFilter:
+    """Спецификация фильтра каталога, собранная из данных ProductFilterForm.
+    Компилируется в один запрос без дополнительных join по предложениям:
+    цена, наличие и бесплатная доставка берутся из сводных цен,
+    сочетание наличия и бесплатной доставки у одного предложения проверяется через Exists()"""
+
+    def __init__(self, price_from=None, price_to=None, name: str = "", in_stock=False, free_delivery=False):
+        self.price_from = price_from
+        self.price_to = price_to
+        self.name = (name or "").strip()
+        self.in_stock = bool(in_stock)
+        self.free_delivery = bool(free_delivery)
+
+    @classmethod
+    def from_data(cls, data: dict) -> "ProductFilter":
+        """Создание фильтра из cleaned_data формы или сохраненной в сессии копии"""
+        price_from, price_to = cls.parse_price(data.get("price") or "")
+        return cls(
+            price_from=price_from,
+            price_to=price_to,
+            name=data.get("name"),
+            in_stock=data.get("in_stock"),
+            free_delivery=data.get("free_delivery"),
+        )
+
+    @staticmethod
+    def parse_price(value: str) -> (Decimal or None, Decimal or None):
+        """Разбор значения слайдера вида 'от;до'"""
+        try:
+            price_from, price_to = (Decimal(price) for price in value.split(";"))
+        except (ValueError, InvalidOperation):
+            return None, None
+        return price_from, price_to
+
+    def __call__(self, products):
+        return products.filter(self.condition())
+
+    def condition(self) -> Q:
+        """Условие фильтра целиком"""
+        condition = Q()
+        if self.price_from is not None:
+            condition &= Q(price_summary__avg_price__range=(self.price_from, self.price_to))
+        if self.name:
+            condition &= self.name_condition()
+        if self.in_stock:
+            condition &= Q(price_summary__in_stock=True)
+        if self.free_delivery:
+            condition &= Q(price_summary__free_shipping=True)
+        if self.in_stock and self.free_delivery:
+            condition &= Q(Exists(self.offers()))
+        return condition
+
+    def name_condition(self) -> Q:
+        """Поиск по наименованию. На PostgreSQL icontains обслуживается триграммным GIN индексом"""
+        return Q(name__icontains=self.name)
+
+    def offers(self):
+        """Предложения продукта, удовлетворяющие условиям фильтра.
+        Наличие и бесплатная доставка проверяются у одного и того же предложения"""
+        offers = Offer.objects.filter(product=OuterRef("pk"))
+        if self.in_stock:
+            offers = offers.filter(product_in_stock=True)
+        if self.free_delivery:
+            offers = offers.filter(free_shipping=True)
+        return offers
@@ -0,0 +1,136 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Max, Q, When
+
+from catalog.models import ProductSearchDocument, ProductSearchTerm
+from products.models import Product
+
+BATCH_SIZE = 500
+SEARCH_LIMIT = 1000
+SEARCH_CONFIG = "russian"
+TERM_LENGTH = 64
+TOKEN = re.compile(r"\w+")
+DOCUMENT_FIELDS = ("name", "tags", "properties", "description")
+# Вес поля в ранжировании: буква для setweight на PostgreSQL и число для инвертированного индекса
+FIELD_WEIGHTS = {"name": ("A", 1.0), "tags": ("B", 0.6), "properties": ("C", 0.4), "description": ("D", 0.2)}
+
+
+def tokenize(text: str) -> list:
+    """Разбиение текста на термины в нижнем регистре"""
+    return [token[:TERM_LENGTH] for token in TOKEN.findall((text or "").lower())]
+
+
+def uses_tsvector() -> bool:
+    return connection.vendor == "postgresql"
+
+
+def build_documents(product_ids) -> list:
+    """Поисковые документы продуктов: наименование, тэги, значения свойств и описание"""
+    products = Product.objects.filter(pk__in=product_ids).prefetch_related("tags", "productproperty_set")
+    return [
+        ProductSearchDocument(
+            product_id=product.pk,
+            name=product.name,
+            tags=" ".join(tag.name for tag in product.tags.all()),
+            properties=" ".join(prop.value for prop in product.productproperty_set.all()),
+            description=product.description,
+        )
+        for product in products
+    ]
+
+
+def build_terms(document: ProductSearchDocument) -> list:
+    """Записи инвертированного индекса документа. Вес термина - сумма весов полей, в которых он встречается"""
+    weights = {}
+    for field in DOCUMENT_FIELDS:
+        for term in set(tokenize(getattr(document, field))):
+            weights[term] = weights.get(term, 0) + FIELD_WEIGHTS[field][1]
+    return [
+        ProductSearchTerm(product_id=document.product_id, term=term, weight=weight) for term, weight in weights.items()
+    ]
+
+
+def refresh_search_index(product_ids) -> None:
+    """Пересчет поисковых документов продуктов пачками.
+    На PostgreSQL обновляется tsvector, на остальных базах - инвертированный индекс терминов"""
+    product_ids = list(set(product_ids))
+    while product_ids:
+        chunk, product_ids = product_ids[:BATCH_SIZE], product_ids[BATCH_SIZE:]
+        _refresh_chunk(chunk)
+
+
+def _refresh_chunk(product_ids: list) -> None:
+    documents = build_documents(product_ids)
+    ProductSearchDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=["product"], update_fields=DOCUMENT_FIELDS
+    )
+    if uses_tsvector():
+        from django.contrib.postgres.search import SearchVector
+
+        vector = reduce(
+            lambda left, right: left + right,
+            (SearchVector(field, weight=FIELD_WEIGHTS[field][0], config=SEARCH_CONFIG) for field in DOCUMENT_FIELDS),
+        )
+        ProductSearchDocument.objects.filter(product_id__in=product_ids).update(vector=vector)
+        return
+    ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+    ProductSearchTerm.objects.bulk_create(term for document in documents for term in build_terms(document))
+
+
+def schedule_search_refresh(product_ids) -> None:
+    """Откладывает пересчет поисковых документов до фиксации текущей транзакции"""
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_search_index(product_ids))
+
+
+def rebuild_search_index() -> int:
+    """Полный пересчет поискового индекса, возвращает количество продуктов"""
+    product_ids = list(Product.objects.values_list("pk", flat=True))
+    refresh_search_index(product_ids)
+    return len(product_ids)
+
+
+def search_product_ids(query: str, limit: int = SEARCH_LIMIT) -> list:
+    """Id продуктов, содержащих все слова запроса (с учетом префиксов), по убыванию релевантности"""
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+    if uses_tsvector():
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        search_query = SearchQuery(
+            " & ".join(f"{token}:*" for token in tokens), search_type="raw", config=SEARCH_CONFIG
+        )
+        documents = (
+            ProductSearchDocument.objects.filter(vector=search_query)
+            .annotate(rank=SearchRank(F("vector"), search_query))
+            .order_by("-rank", "product_id")
+        )
+        return list(documents.values_list("product_id", flat=True)[:limit])
+    matches = {
+        f"match_{index}": Max(
+            Case(When(term__startswith=token, then=F("weight")), default=0.0, output_field=FloatField())
+        )
+        for index, token in enumerate(tokens)
+    }
+    terms = (
+        ProductSearchTerm.objects.filter(reduce(or_, (Q(term__startswith=token) for token in tokens)))
+        .values("product_id")
+        .annotate(**matches)
+        .filter(**{f"{name}__gt": 0 for name in matches})
+        .annotate(rank=reduce(lambda left, right: left + right, (F(name) for name in matches)))
+        .order_by("-rank", "product_id")
+    )
+    return list(terms.values_list("product_id", flat=True)[:limit])
+
+
+def search_products(query: str):
+    """Продукты по поисковому запросу в порядке релевантности"""
+    product_ids = search_product_ids(query)
+    return Product.objects.filter(pk__in=product_ids).order_by(
+        Case(*(When(pk=pk, then=position) for position, pk in enumerate(product_ids)), default=len(product_ids))
+    )
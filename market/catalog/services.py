@@ -1,32 +1,59 @@
-from django.core.paginator import Paginator
-from django.db.models import Q, Avg, Min
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, DateTimeField, DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpRequest
 
+from catalog.cache_for_catalog import result_key
+from catalog.cursor_pagination import CursorPage, CursorPaginator
 from catalog.forms import ProductFilterForm
-from catalog.price_and_discounts import check_discount_price, min_price, max_price
-from products.models import Product
+from catalog.price_and_discounts import price_bounds
+from catalog.product_filter import ProductFilter
+from catalog.search import search_products
+from products.models import Browsing_history, Product, Review
 from site_settings.models import SiteSettings
 from shops.services.compare import compare_list_check
+from shops.services.offer_discount import prefetch_offer_discounts
 
 
-def get_paginator(request: HttpRequest or dict, products, forms) -> dict:
-    """Представление пагинации 'Каталог продуктов' и сессия для сортировки"""
+def get_paginator(request: HttpRequest or dict, products, forms, cursor: bool = False, category: str = None) -> dict:
+    """Представление пагинации 'Каталог продуктов' и сессия для сортировки.
+    При cursor=True используется курсорная пагинация без COUNT(*) и OFFSET.
+    Идентификаторы продуктов страницы кэшируются в пространстве имен категории.
+    Сортировки по популярности не кэшируются: просмотры и отзывы не сбрасывают поколения категорий"""
     if request.GET.get("sort"):
         request.session["sorted"] = request.GET.get("sort")
-        sort = request.session["sorted"]
-        products = sorted_products(sort, products)
-    else:
-        if "sorted" in request.session:
-            sort_session = request.session["sorted"]
-            products = sorted_products(sort_session, products)
+    sort = request.session.get("sorted")
     if request.POST.get("add_compare"):
         get = request.POST.get("add_compare")
         compare_list_check(request.session, get)
-    pagination_value = SiteSettings.objects.values_list('pagination_size', flat=True).first()
-    paginator = Paginator(products, pagination_value)
-    check_discount_price()
-    page = request.GET.get("page")
-    page_obj = paginator.get_page(page)
+    pagination_value = SiteSettings.objects.values_list("pagination_size", flat=True).first()
+    try:
+        query = str(products.query)
+    except EmptyResultSet:
+        query = None
+    params = {
+        "query": query,
+        "sort": sort,
+        "size": pagination_value,
+        "cursor": cursor,
+        "page": request.GET.get("cursor") if cursor else request.GET.get("page"),
+        "count": bool(request.GET.get("count")),
+    }
+    key = result_key(category, **params) if sort not in POPULARITY_SORTS else None
+    state = cache.get(key) if key else None
+    if state is None:
+        page_obj = paginate(products, pagination_value, **params)
+        if key:
+            cache.set(key, page_state(page_obj), settings.CACHE_CONSTANT)
+    else:
+        page_obj = restore_page(state, pagination_value)
+    page_obj.object_list = prefetch_offer_discounts(page_obj.object_list)
 
     context = {
         "page_obj": page_obj,
@@ -35,86 +62,94 @@ def get_paginator(request: HttpRequest or dict, products, forms) -> dict:
     return context
 
 
-def sorted_products(sort: str, product) -> list or dict:
-    """Сортировка по критериям"""
-    if sort in "offers__price":
-        product = (
-            product.prefetch_related("offers")
-            .annotate(average_stars=Avg("offers__discount_price"))
-            .order_by("average_stars")
-        )
-        return product
-    elif sort in "-offers__date_of_creation":
-        product = product.prefetch_related("offers").annotate(date=Min("offers__date_of_creation")).order_by("-date")
-        return product
-    elif sort in ("sorting.get_count_history()", "sorting.get_count_reviews()"):
-        product = {
-            sorting: sorting.get_count_reviews()
-            if sort == "sorting.get_count_reviews()"
-            else sorting.get_count_history()
-            for sorting in product
-        }
-        product = sorted(product.items(), key=lambda key: key[1])[::-1]
-        product = [value for value, key in product]
-        return product
+def paginate(products, per_page: int, sort: str = None, cursor: bool = False, page: str = None, count=False, **kwargs):
+    """Страница каталога: курсорная при cursor=True (page - токен курсора), иначе постраничная"""
+    if cursor:
+        sort, keys = cursor_sort_keys(sort)
+        paginator = CursorPaginator(annotate_cursor_keys(sort, products), per_page, keys, sort, with_count=count)
+        return paginator.get_page(page)
+    if sort:
+        products = sorted_products(sort, products)
+    return Paginator(products, per_page).get_page(page)
+
+
+def page_state(page_obj) -> dict:
+    """Состояние страницы для кэша: упорядоченные id продуктов и данные навигации"""
+    state = {"ids": [product.pk for product in page_obj.object_list]}
+    if isinstance(page_obj, CursorPage):
+        state.update(next_cursor=page_obj.next_cursor, count=page_obj.count)
     else:
-        return product
+        state.update(number=page_obj.number, count=page_obj.paginator.count)
+    return state
 
 
-def filter_search(session: dict, products) -> dict:
-    """Фильтрация продуктов"""
-    prices = session["price"].split(";")
-    sessions = {value: key for value, key in session.items() if (session[value] and value != "price")}
-    product_search = (
-        products.prefetch_related("offers")
-        .annotate(discount=Avg("offers__discount_price"))
-        .filter(
-            (
-                Q(name__icontains="" if sessions.get("name") is None else sessions["name"])
-                & Q(discount__range=(prices[0], prices[1]))
-            )
-        )
-    )
-
-    if sessions.get("in_stock"):
-        product_search = (
-            products.prefetch_related("offers")
-            .annotate(discount=Avg("offers__discount_price"))
-            .filter(
-                (
-                    Q(name__icontains="" if sessions.get("name") is None else sessions["name"])
-                    & Q(discount__range=(prices[0], prices[1]))
-                )
-                & Q(offers__product_in_stock=None if sessions.get("in_stock") is None else sessions["in_stock"])
-            )
-        )
+def restore_page(state: dict, per_page: int):
+    """Страница из кэша: продукты загружаются одним запросом по id в сохраненном порядке"""
+    products = Product.objects.in_bulk(state["ids"])
+    object_list = [products[pk] for pk in state["ids"] if pk in products]
+    if "next_cursor" in state:
+        return CursorPage(object_list, state["next_cursor"], state["count"])
+    paginator = Paginator(Product.objects.none(), per_page)
+    paginator.count = state["count"]
+    return Page(object_list, state["number"], paginator)
 
-    if sessions.get("free_delivery"):
-        product_search = (
-            products.prefetch_related("offers")
-            .annotate(discount=Avg("offers__discount_price"))
-            .filter(
-                (
-                    Q(name__icontains="" if sessions.get("name") is None else sessions["name"])
-                    & Q(discount__range=(prices[0], prices[1]))
-                )
-                & Q(offers__free_shipping=None if sessions.get("free_delivery") is None else sessions["free_delivery"])
-            )
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+POPULARITY_SORTS = {
+    "sorting.get_count_history()": "views_count",
+    "sorting.get_count_reviews()": "reviews_count",
+}
+
+
+def count_subquery(model, field: str = "product") -> Coalesce:
+    """Количество записей модели, относящихся к продукту, в виде подзапроса"""
+    counts = model.objects.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(count=Count("pk"))
+    return Coalesce(Subquery(counts.values("count")), 0)
+
+
+def annotate_popularity(products):
+    """Аннотация количества просмотров и отзывов продуктов коррелированными подзапросами"""
+    return products.annotate(views_count=count_subquery(Browsing_history), reviews_count=count_subquery(Review))
+
+
+def cursor_sort_keys(sort: str or None) -> (str, list):
+    """Название сортировки и ключи курсорной пагинации в том же порядке, что и в sorted_products"""
+    if sort and sort in "offers__price":
+        return "offers__price", [("cursor_price", False), ("pk", False)]
+    elif sort and sort in "-offers__date_of_creation":
+        return "-offers__date_of_creation", [("cursor_date", True), ("pk", True)]
+    elif sort in POPULARITY_SORTS:
+        return sort, [(POPULARITY_SORTS[sort], True), ("pk", True)]
+    return "", [("pk", False)]
+
+
+def annotate_cursor_keys(sort: str, products):
+    """Аннотация ключей курсора. Продукты без сводной цены получают граничное значение вместо NULL"""
+    if sort == "offers__price":
+        return products.annotate(
+            cursor_price=Coalesce("price_summary__avg_price", Value(Decimal(0)), output_field=DecimalField())
         )
-    if sessions.get("in_stock") and sessions.get("free_delivery"):
-        product_search = (
-            products.prefetch_related("offers")
-            .annotate(discount=Avg("offers__discount_price"))
-            .filter(
-                (
-                    Q(name__icontains="" if sessions.get("name") is None else sessions["name"])
-                    & Q(discount__range=(prices[0], prices[1]))
-                )
-                & Q(offers__free_shipping=None if sessions.get("free_delivery") is None else sessions["free_delivery"])
-                & Q(offers__product_in_stock=None if sessions.get("in_stock") is None else sessions["in_stock"])
-            )
+    elif sort == "-offers__date_of_creation":
+        return products.annotate(
+            cursor_date=Coalesce("price_summary__oldest_offer_date", Value(EPOCH), output_field=DateTimeField())
         )
-    return product_search.distinct()
+    elif sort in POPULARITY_SORTS:
+        return annotate_popularity(products)
+    return products
+
+
+def sorted_products(sort: str, product) -> list or dict:
+    """Сортировка по критериям. Ключи и порядок те же, что и у курсорной пагинации,
+    новизна продукта - дата его первого предложения"""
+    sort, keys = cursor_sort_keys(sort)
+    if not sort:
+        return product
+    return annotate_cursor_keys(sort, product).order_by(*(f"-{key}" if desc else key for key, desc in keys))
+
+
+def filter_search(session: dict, products) -> dict:
+    """Фильтрация продуктов по данным формы фильтра"""
+    return ProductFilter.from_data(session)(products)
 
 
 def session_verification(session: dict) -> dict or None:
@@ -125,16 +160,17 @@ def session_verification(session: dict) -> dict or None:
         form = ProductFilterForm(session["filter"])
         if "search" in session:
             search = session["search"]
-            products = Product.objects.filter((Q(name__icontains=search)))
+            products = search_products(search)
         else:
             products = Product.objects.all()
         if form.is_valid():
+            min_price, max_price = price_bounds()
             form.fields["price"].widget.attrs.update(
                 {
                     "data-from": prices[0],
                     "data-to": prices[1],
-                    "data-min": str(min_price()),
-                    "data-max": str(max_price()),
+                    "data-min": str(min_price),
+                    "data-max": str(max_price),
                 }
             )
             products = filter_search(sessions, products)
@@ -1,15 +1,9 @@
-from django.db.models import Q
 from django.http import HttpResponse, HttpRequest
 from django.shortcuts import render
 
 from catalog.forms import ProductFilterForm
-from catalog.price_and_discounts import (
-    min_price,
-    max_price,
-    check_discount_price,
-    min_price_for_category,
-    max_price_for_category,
-)
+from catalog.price_and_discounts import price_bounds
+from catalog.search import search_products
 from catalog.services import filter_search, get_paginator, session_verification
 from products.models import Product
 
@@ -17,42 +11,45 @@ from products.models import Product
 class CatalogMixin:
     """Представление 'Каталог продуктов'"""
 
+    cursor_pagination = False
+
     def get(self, request: HttpRequest and dict) -> HttpResponse:
         sessions = request.session
         if session_verification(sessions):
             products, form = session_verification(sessions)
         else:
             form = ProductFilterForm()
+            min_price, max_price = price_bounds()
             form.fields["price"].widget.attrs.update(
                 {
-                    "data-from": str(min_price() + (min_price() * 30 / 100)),
-                    "data-to": str(max_price() - (max_price() * 20 / 100)),
-                    "data-min": str(min_price()),
-                    "data-max": str(max_price()),
+                    "data-from": str(min_price + (min_price * 30 / 100)),
+                    "data-to": str(max_price - (max_price * 20 / 100)),
+                    "data-min": str(min_price),
+                    "data-max": str(max_price),
                 }
             )
             if request.session.get("search"):
-                products = Product.objects.filter((Q(name__icontains=sessions["search"])))
+                products = search_products(sessions["search"])
             else:
                 products = Product.objects.all().prefetch_related("offers")
-        context = get_paginator(request, products, form)
+        context = get_paginator(request, products, form, cursor=self.cursor_pagination)
         return render(request, "market/catalog/catalog.jinja2", context=context)
 
     def post(self, request: HttpRequest) -> HttpResponse:
         if request.session.get("search"):
-            product = Product.objects.filter((Q(name__icontains=request.session.get("search"))))
+            product = search_products(request.session.get("search"))
         else:
             product = Product.objects.all().prefetch_related("offers")
         form = ProductFilterForm(request.POST)
         if form.is_valid():
             prices = form.cleaned_data["price"].split(";")
-            check_discount_price()
+            min_price, max_price = price_bounds()
             form.fields["price"].widget.attrs.update(
                 {
                     "data-from": prices[0],
                     "data-to": prices[1],
-                    "data-min": str(min_price()),
-                    "data-max": str(max_price()),
+                    "data-min": str(min_price),
+                    "data-max": str(max_price),
                 }
             )
             request.session.set_expiry(180)
@@ -61,13 +58,15 @@ class CatalogMixin:
             product = filter_search(session, product)
         else:
             form = ProductFilterForm()
-        context = get_paginator(request, product, form)
+        context = get_paginator(request, product, form, cursor=self.cursor_pagination)
         return render(request, "market/catalog/catalog.jinja2", context=context)
 
 
 class CatalogCategoryMixin:
     """Представление 'Каталог продуктов по категориям'"""
 
+    cursor_pagination = False
+
     def get(self, request: HttpRequest, slug: str) -> HttpResponse:
         if request.session.get("path") == request.path:
             if "filter" in request.session:
@@ -76,27 +75,29 @@ class CatalogCategoryMixin:
                 products = Product.objects.filter(category__slug=slug)
                 form = ProductFilterForm(request.session["filter"])
                 if form.is_valid():
+                    min_price, max_price = price_bounds(slug)
                     form.fields["price"].widget.attrs.update(
                         {
                             "data-from": prices[0],
                             "data-to": prices[1],
-                            "data-min": str(min_price_for_category(slug)),
-                            "data-max": str(max_price_for_category(slug)),
+                            "data-min": str(min_price),
+                            "data-max": str(max_price),
                         }
                     )
                     products = filter_search(sessions, products)
         else:
             form = ProductFilterForm()
+            min_price, max_price = price_bounds(slug)
             form.fields["price"].widget.attrs.update(
                 {
-                    "data-from": str(min_price_for_category(slug)),
-                    "data-to": str(max_price_for_category(slug)),
-                    "data-min": str(min_price_for_category(slug)),
-                    "data-max": str(max_price_for_category(slug)),
+                    "data-from": str(min_price),
+                    "data-to": str(max_price),
+                    "data-min": str(min_price),
+                    "data-max": str(max_price),
                 }
             )
             products = Product.objects.filter(category__slug=slug)
-        context = get_paginator(request, products, form)
+        context = get_paginator(request, products, form, cursor=self.cursor_pagination, category=slug)
         return render(request, "market/catalog/catalog.jinja2", context=context)
 
     def post(self, request: HttpRequest, slug: str) -> HttpResponse:
@@ -104,13 +105,13 @@ class CatalogCategoryMixin:
         form = ProductFilterForm(request.POST)
         if form.is_valid():
             prices = form.cleaned_data["price"].split(";")
-            check_discount_price()
+            min_price, max_price = price_bounds(slug)
             form.fields["price"].widget.attrs.update(
                 {
                     "data-from": prices[0],
                     "data-to": prices[1],
-                    "data-min": str(min_price_for_category(slug)),
-                    "data-max": str(max_price_for_category(slug)),
+                    "data-min": str(min_price),
+                    "data-max": str(max_price),
                 }
             )
             request.session.set_expiry(60 * 20)
@@ -120,5 +121,5 @@ class CatalogCategoryMixin:
             product = filter_search(session, product)
         else:
             form = ProductFilterForm()
-        context = get_paginator(request, product, form)
+        context = get_paginator(request, product, form, cursor=self.cursor_pagination, category=slug)
         return render(request, "market/catalog/catalog.jinja2", context=context)
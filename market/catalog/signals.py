@@ -0,0 +1,27 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from catalog.search import schedule_search_refresh
+from products.models import Product, ProductProperty
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """Пересчет поискового документа продукта после изменения наименования или описания"""
+    if not raw:
+        schedule_search_refresh([instance.pk])
+
+
+@receiver(post_save, sender=ProductProperty)
+@receiver(post_delete, sender=ProductProperty)
+def product_property_changed(sender, instance, raw=False, **kwargs):
+    """Пересчет поискового документа после изменения значений свойств продукта"""
+    if not raw:
+        schedule_search_refresh([instance.product_id])
+
+
+@receiver(m2m_changed, sender=Product.tags.through)
+def product_tags_changed(sender, instance, action, reverse, **kwargs):
+    """Пересчет поискового документа после изменения тэгов продукта"""
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, Product):
+        schedule_search_refresh([instance.pk])
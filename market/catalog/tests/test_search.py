@@ -0,0 +1,55 @@
+from django.test import TestCase
+
+from catalog.search import rebuild_search_index, search_product_ids, search_products, tokenize
+from products.models import Product, ProductProperty
+
+
+class ProductSearchTest(TestCase):
+    """Тестирование поискового индекса продуктов"""
+
+    fixtures = [
+        "fixtures/010_auth_group.json",
+        "fixtures/011_users.json",
+        "fixtures/020_catalog_categories.json",
+        "fixtures/025_products.json",
+        "fixtures/030_property.json",
+        "fixtures/035_productproperty.json",
+    ]
+
+    def setUp(self):
+        rebuild_search_index()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Ноутбук, 15.6'' Silver"), ["ноутбук", "15", "6", "silver"])
+
+    def test_search_by_fields(self):
+        """Поиск по префиксам слов наименования, значений свойств и описания"""
+        self.assertEqual(search_product_ids("стирал"), [7])
+        self.assertEqual(search_product_ids("ноут silv"), [3])
+        self.assertEqual(sorted(search_product_ids("Ноутбук")), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(search_product_ids("планшет"), [])
+        self.assertEqual(search_product_ids("  "), [])
+
+    def test_ranking(self):
+        """Совпадение в наименовании важнее совпадения в описании"""
+        Product.objects.filter(pk=6).update(description="стиральная машина в подарок")
+        rebuild_search_index()
+        self.assertEqual(search_product_ids("стиральная"), [7, 6])
+        self.assertEqual(list(search_products("стиральная").values_list("pk", flat=True)), [7, 6])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении продукта, его свойств и тэгов"""
+        product = Product.objects.get(pk=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = "Посудомоечная машина"
+            product.save()
+        self.assertEqual(search_product_ids("посудо"), [7])
+        self.assertEqual(search_product_ids("стирал"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductProperty.objects.filter(product_id=3, value="Silver").delete()
+        self.assertEqual(search_product_ids("silver"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.tags.add("Бытовая техника")
+        self.assertEqual(search_product_ids("бытов"), [7])
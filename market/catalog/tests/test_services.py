@@ -0,0 +1,334 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Min, Q
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import RequestFactory, TestCase
+
+from catalog.models import Catalog, ProductPriceSummary
+from catalog.price_and_discounts import PRICE_BOUNDS_KEY, max_price, min_price_for_category, price_bounds
+from catalog.product_filter import ProductFilter
+from catalog.cache_for_catalog import (
+    CATEGORIES_FRAGMENT,
+    bump_generations,
+    clear_cache_catalog,
+    clear_cache_category,
+    generation,
+    invalidate,
+    tag_keys,
+    tagged_cache_page,
+)
+from catalog.cursor_pagination import CursorPaginator, encode_cursor
+from catalog.services import (
+    POPULARITY_SORTS,
+    annotate_cursor_keys,
+    cursor_sort_keys,
+    filter_search,
+    get_paginator,
+    sorted_products,
+)
+from discounts.services.price_materializer import rebuild_discount_prices
+from products.models import Browsing_history, Product
+from shops.models import Offer
+
+
+class ProductPriceSummaryTest(TestCase):
+    """Тестирование сводных цен продуктов"""
+
+    fixtures = [
+        "fixtures/010_auth_group.json",
+        "fixtures/011_users.json",
+        "fixtures/020_catalog_categories.json",
+        "fixtures/025_products.json",
+        "fixtures/040_shops.json",
+        "fixtures/045_offers.json",
+    ]
+
+    def setUp(self):
+        rebuild_discount_prices()
+
+    def test_summary_values(self):
+        """Сводная цена совпадает с агрегатами по предложениям"""
+        summary = ProductPriceSummary.objects.get(product_id=6)
+        self.assertEqual(summary.offer_count, 2)
+        self.assertEqual(summary.min_price, Decimal("5000.00"))
+        self.assertEqual(summary.max_price, Decimal("10005.00"))
+        self.assertEqual(summary.avg_price, Decimal("7502.50"))
+        self.assertEqual(summary.category_id, 1)
+        self.assertTrue(summary.in_stock)
+        self.assertTrue(summary.free_shipping)
+
+    def test_summary_follows_offers(self):
+        """Сводная цена обновляется при изменении и удалении предложений"""
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = Offer.objects.get(id=17)
+            offer.product_in_stock = False
+            offer.save()
+        self.assertFalse(ProductPriceSummary.objects.get(product_id=7).in_stock)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.get(id=17).delete()
+        self.assertFalse(ProductPriceSummary.objects.filter(product_id=7).exists())
+
+    def test_filter_and_sort(self):
+        """Фильтрация и сортировка каталога по сводным ценам"""
+        session = {"price": "7000;7600", "name": "", "in_stock": True, "free_delivery": True}
+        products = filter_search(session, Product.objects.all())
+        products = list(sorted_products("offers__price", products))
+        self.assertEqual([product.id for product in products], [2, 4, 6])
+        self.assertEqual(max_price(), 50000)
+        self.assertEqual(min_price_for_category("noutbuki"), 6751)
+
+    def test_filter_spec(self):
+        """Фильтр компилируется в один запрос, условия проверяются у одного предложения"""
+        product_filter = ProductFilter.from_data({"price": "7000;7600", "in_stock": True, "free_delivery": True})
+        with self.assertNumQueries(1):
+            self.assertEqual(sorted(product_filter(Product.objects.all()).values_list("id", flat=True)), [2, 4, 6])
+        Offer.objects.filter(product_id=6, free_shipping=True).update(product_in_stock=False)
+        Offer.objects.filter(product_id=6, free_shipping=False).update(product_in_stock=True)
+        self.assertNotIn(6, product_filter(Product.objects.all()).values_list("id", flat=True))
+        self.assertEqual(ProductFilter.from_data({"price": "", "name": "  "}).condition(), Q())
+
+    def test_filter_flags_from_summary(self):
+        """Одиночные признаки наличия и бесплатной доставки проверяются по сводным ценам"""
+        for field, flag, offer_field in (
+            ("in_stock", "in_stock", "product_in_stock"),
+            ("free_shipping", "free_delivery", "free_shipping"),
+        ):
+            with self.subTest(field=field):
+                product_filter = ProductFilter.from_data({flag: True})
+                expected = set(Offer.objects.filter(**{offer_field: True}).values_list("product_id", flat=True))
+                self.assertEqual(set(product_filter(Product.objects.all()).values_list("id", flat=True)), expected)
+                ProductPriceSummary.objects.filter(product_id__in=expected).update(**{field: False})
+                self.assertFalse(product_filter(Product.objects.all()).exists())
+
+
+class PriceBoundsCacheTest(TestCase):
+    """Тестирование кэша границ слайдера цены"""
+
+    fixtures = ProductPriceSummaryTest.fixtures
+
+    def setUp(self):
+        rebuild_discount_prices()
+        cache.clear()
+
+    def test_bounds_cached(self):
+        """Повторное получение границ не обращается к базе"""
+        bounds = price_bounds("noutbuki")
+        with self.assertNumQueries(0):
+            self.assertEqual(price_bounds("noutbuki"), bounds)
+
+    def test_bounds_invalidated_by_scope(self):
+        """Изменение цены сбрасывает границы только своей категории и всего каталога"""
+        price_bounds()
+        price_bounds("noutbuki")
+        cache.set(PRICE_BOUNDS_KEY.format(scope="other"), (1, 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = Offer.objects.get(product_id=6, price=Decimal("10005.00"))
+            offer.price = Decimal("200000.00")
+            offer.save()
+        self.assertIsNone(cache.get(PRICE_BOUNDS_KEY.format(scope="noutbuki")))
+        self.assertEqual(cache.get(PRICE_BOUNDS_KEY.format(scope="other")), (1, 2))
+        self.assertEqual(max_price(), 102500)
+
+
+class PopularitySortTest(TestCase):
+    """Тестирование сортировки каталога по популярности"""
+
+    fixtures = ProductPriceSummaryTest.fixtures + ["fixtures/085_reviews.json"]
+
+    def setUp(self):
+        for user_id, product_id in ((1, 3), (2, 3), (1, 5), (3, 3), (2, 5), (1, 7)):
+            Browsing_history.objects.create(users_id=user_id, product_id=product_id)
+
+    def python_sorted(self, method: str) -> list:
+        """Прежняя сортировка: подсчет для каждого продукта и сортировка в Python"""
+        products = {product: getattr(product, method)() for product in Product.objects.order_by("pk")}
+        return [product.pk for product, count in sorted(products.items(), key=lambda item: item[1])[::-1]]
+
+    def test_sort_matches_previous_ordering(self):
+        """Сортировка в базе совпадает с прежней и выполняется одним запросом"""
+        for sort, method in (
+            ("sorting.get_count_history()", "get_count_history"),
+            ("sorting.get_count_reviews()", "get_count_reviews"),
+        ):
+            with self.subTest(sort=sort):
+                expected = self.python_sorted(method)
+                with self.assertNumQueries(1):
+                    products = list(sorted_products(sort, Product.objects.all()))
+                    counts = [getattr(product, method)() for product in products]
+                self.assertEqual([product.pk for product in products], expected)
+                self.assertEqual(counts, sorted(counts, reverse=True))
+
+
+class CursorPaginationTest(TestCase):
+    """Тестирование курсорной пагинации каталога"""
+
+    fixtures = PopularitySortTest.fixtures
+
+    def setUp(self):
+        rebuild_discount_prices()
+        PopularitySortTest.setUp(self)
+
+    def walk(self, sort: str or None, per_page: int = 2) -> list:
+        """Обход всех страниц по курсорам, каждая страница выполняется одним запросом"""
+        sort, keys = cursor_sort_keys(sort)
+        paginator = CursorPaginator(annotate_cursor_keys(sort, Product.objects.all()), per_page, keys, sort)
+        products, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.get_page(cursor)
+            products.extend(product.pk for product in page)
+            if not page.has_next():
+                return products
+            cursor = page.next_cursor
+
+    def test_pages_match_sorting(self):
+        """Обход по курсорам дает тот же порядок, что и сортировка каталога"""
+        self.assertEqual(self.walk(None), list(Product.objects.order_by("pk").values_list("pk", flat=True)))
+        for sort in (*POPULARITY_SORTS, "offers__price", "-offers__date_of_creation"):
+            with self.subTest(sort=sort):
+                expected = [product.pk for product in sorted_products(sort, Product.objects.all())]
+                self.assertEqual(self.walk(sort), expected)
+
+    def test_newest_sort_by_first_offer(self):
+        """Новизна продукта определяется датой его первого предложения, как до сводных цен"""
+        expected = list(
+            Product.objects.annotate(date=Min("offers__date_of_creation"))
+            .filter(date__isnull=False)
+            .order_by("-date", "-pk")
+            .values_list("pk", flat=True)
+        )
+        products = [product.pk for product in sorted_products("-offers__date_of_creation", Product.objects.all())]
+        self.assertEqual([pk for pk in products if pk in expected], expected)
+
+    def test_foreign_cursor_starts_from_first_page(self):
+        """Курсор другой сортировки или поврежденный курсор открывает первую страницу"""
+        sort, keys = cursor_sort_keys(None)
+        paginator = CursorPaginator(Product.objects.all(), 2, keys, sort, with_count=True)
+        first = paginator.get_page()
+        self.assertEqual(first.count, Product.objects.count())
+        for cursor in (encode_cursor("offers__price", ["1", "1"]), "not-a-cursor"):
+            self.assertEqual(list(paginator.get_page(cursor)), list(first))
+
+
+class CatalogResultCacheTest(TestCase):
+    """Тестирование кэша результатов каталога с поколениями пространств имен"""
+
+    fixtures = ProductPriceSummaryTest.fixtures + ["fixtures/090_site_settings.json"]
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_discount_prices()
+        cache.clear()
+
+    def page_ids(self, slug: str = None, **params) -> list:
+        request = RequestFactory().get("/", params)
+        request.session = {}
+        products = Product.objects.filter(category__slug=slug) if slug else Product.objects.all()
+        return [product.pk for product in get_paginator(request, products, None, category=slug)["page_obj"]]
+
+    def test_result_cached_until_generation_bump(self):
+        """Страница берется из кэша, пока не изменится поколение ее пространства имен"""
+        expected = self.page_ids("noutbuki")
+        Product.objects.filter(pk=expected[0]).update(category_id=2)
+        self.assertEqual(self.page_ids("noutbuki"), expected)
+
+        Product.objects.filter(pk=expected[0]).update(category_id=1)
+        global_generation, category_generation = generation(), generation("noutbuki")
+        product = Product.objects.get(pk=expected[0])
+        product.category_id = 2
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertGreater(generation(), global_generation)
+        self.assertGreater(generation("noutbuki"), category_generation)
+        self.assertNotIn(expected[0], self.page_ids("noutbuki"))
+
+    def test_stock_change_bumps_generation(self):
+        """Изменение наличия или бесплатной доставки предложения сбрасывает кэш его категории"""
+        summary = ProductPriceSummary.objects.select_related("category").get(offer_count=1)
+        offer, slug = Offer.objects.get(product_id=summary.product_id), summary.category.slug
+        for field in ("product_in_stock", "free_shipping"):
+            with self.subTest(field=field):
+                category_generation = generation(slug)
+                setattr(offer, field, not getattr(offer, field))
+                with self.captureOnCommitCallbacks(execute=True):
+                    offer.save()
+                self.assertGreater(generation(slug), category_generation)
+
+    def test_pages_and_sorts_cached_separately(self):
+        """Разные страницы и сортировки хранятся под разными ключами"""
+        first, second = self.page_ids(), self.page_ids(page=2)
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.page_ids(page=2), second)
+        self.assertEqual(self.page_ids(sort="offers__price"), self.page_ids(sort="offers__price"))
+
+    def test_popularity_sorts_not_cached(self):
+        """Сортировка по популярности сразу учитывает новые просмотры"""
+        sort = "sorting.get_count_history()"
+        first = self.page_ids(sort=sort)[0]
+        last = Product.objects.exclude(pk=first).order_by("-pk").first()
+        for user_id in (1, 2):
+            Browsing_history.objects.create(users_id=user_id, product_id=last.pk)
+        self.assertEqual(self.page_ids(sort=sort)[0], last.pk)
+
+
+class CacheInvalidationTest(TestCase):
+    """Тестирование сброса кэша по тегам с объединением сбросов в транзакции"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tagged_keys_invalidated(self):
+        """Ключи тега удаляются, ключи других тегов остаются"""
+        cache.set_many({"page.1": 1, "page.2": 2, "other": 3})
+        tag_keys("catalog", "page.1", "page.2")
+        tag_keys("home", "other")
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate(tags=["catalog"])
+        self.assertEqual(cache.get_many(["page.1", "page.2", "other"]), {"other": 3})
+
+    def test_invalidations_coalesced_on_commit(self):
+        """Сбросы внутри транзакции накапливаются и выполняются одним вызовом после фиксации"""
+        cache.set(make_template_fragment_key(CATEGORIES_FRAGMENT), "menu")
+        with self.captureOnCommitCallbacks() as callbacks:
+            for _ in range(3):
+                clear_cache_category()
+                bump_generations(["noutbuki"])
+            self.assertEqual(cache.get(make_template_fragment_key(CATEGORIES_FRAGMENT)), "menu")
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertIsNone(cache.get(make_template_fragment_key(CATEGORIES_FRAGMENT)))
+        self.assertEqual(generation("noutbuki"), 2)
+
+    def test_categories_menu_fragment(self):
+        """Меню категорий в шапке кэшируется под ключом, который сбрасывает clear_cache_category"""
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        render_to_string("market/header.jinja2", {"categories": Catalog.objects.all()}, request=request)
+        self.assertIsNotNone(cache.get(make_template_fragment_key(CATEGORIES_FRAGMENT)))
+        with self.captureOnCommitCallbacks(execute=True):
+            clear_cache_category()
+        self.assertIsNone(cache.get(make_template_fragment_key(CATEGORIES_FRAGMENT)))
+
+    def test_tagged_cache_page(self):
+        """Страница, закэшированная tagged_cache_page, сбрасывается по тегу"""
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            return HttpResponse("ok")
+
+        cached_view = tagged_cache_page(60, key_prefix="catalog")(view)
+        for _ in range(2):
+            cached_view(RequestFactory().get("/catalog/"))
+        self.assertEqual(len(calls), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            clear_cache_catalog()
+        cached_view(RequestFactory().get("/catalog/"))
+        self.assertEqual(len(calls), 2)
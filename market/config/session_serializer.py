@@ -0,0 +1,57 @@
+import msgpack
+from django.conf import settings
+from django.core.signing import JSONSerializer
+
+COMPARISON_SESSION_ID = "comp_list"
+
+
+def pack_cart(cart: dict) -> list:
+    """Корзина плоским списком: id предложения, количество, время добавления"""
+    packed = []
+    for offer_id, item in cart.items():
+        packed += [int(offer_id), item["quantity"], item["created_at"]]
+    return packed
+
+
+def unpack_cart(packed: list) -> dict:
+    return {
+        str(packed[index]): {"quantity": packed[index + 1], "created_at": packed[index + 2]}
+        for index in range(0, len(packed), 3)
+    }
+
+
+def pack_session(session: dict) -> dict:
+    """Компактный вид ключей магазина: корзина - списком, id в списке сравнения - числами"""
+    session = dict(session)
+    if isinstance(session.get(settings.CART_SESSION_ID), dict):
+        session[settings.CART_SESSION_ID] = pack_cart(session[settings.CART_SESSION_ID])
+    comp_list = session.get(COMPARISON_SESSION_ID)
+    if isinstance(comp_list, list) and all(isinstance(offer_id, str) and offer_id.isdigit() for offer_id in comp_list):
+        session[COMPARISON_SESSION_ID] = [int(offer_id) for offer_id in comp_list]
+    return session
+
+
+def unpack_session(session: dict) -> dict:
+    if isinstance(session.get(settings.CART_SESSION_ID), list):
+        session[settings.CART_SESSION_ID] = unpack_cart(session[settings.CART_SESSION_ID])
+    comp_list = session.get(COMPARISON_SESSION_ID)
+    if isinstance(comp_list, list):
+        session[COMPARISON_SESSION_ID] = [
+            str(offer_id) if isinstance(offer_id, int) else offer_id for offer_id in comp_list
+        ]
+    return session
+
+
+class MsgPackSerializer:
+    """
+    Сериализатор сессии в msgpack для SESSION_SERIALIZER.
+    Сессии, сохраненные прежним JSONSerializer, читаются без изменений
+    """
+
+    def dumps(self, obj) -> bytes:
+        return msgpack.packb(pack_session(obj), use_bin_type=True)
+
+    def loads(self, data: bytes):
+        if data[:1] == b"{":
+            return JSONSerializer().loads(data)
+        return unpack_session(msgpack.unpackb(data, raw=False))
@@ -25,6 +25,18 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 AUTH_USER_MODEL = "users.CustomUser"
 APPEND_SLASH = False
 CART_SESSION_ID = "cart"
+CART_SUMMARY_SESSION_ID = "cart_summary"
+# Отложенная запись корзины аутентифицированного пользователя в бд (по умолчанию выключена) и задержка в секундах
+CART_WRITE_BEHIND = False
+CART_PERSIST_DELAY = 5
+# Количество общего предложения при объединении корзин при входе: sum, max, session или db
+CART_MERGE_POLICY = "sum"
+# Корзины без изменений дольше CART_IDLE_DAYS дней удаляются периодической задачей пачками
+CART_IDLE_DAYS = 30
+CART_SWEEP_BATCH_SIZE = 500
+# Время резерва остатка при оформлении заказа в минутах и размер пачки снятия истекших резервов
+STOCK_RESERVATION_MINUTES = 15
+STOCK_RESERVATION_BATCH_SIZE = 500
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.2/howto/deployment/checklist/
@@ -244,7 +256,19 @@ CELERY_BEAT_SCHEDULE = {
     "process_payment_queue": {
         "task": "shops.tasks.process_payment_queue",
         "schedule": timedelta(seconds=60),
-    }
+    },
+    "release_stock_reservations": {
+        "task": "shops.tasks.release_stock_reservations",
+        "schedule": timedelta(minutes=1),
+    },
+    "sweep_abandoned_carts": {
+        "task": "sweep_abandoned_carts",
+        "schedule": timedelta(hours=1),
+    },
+    "check_discounts_last_time": {
+        "task": "check_discounts_last_time",
+        "schedule": timedelta(minutes=10),
+    },
 }
 
 IMPORT_DONE = BASE_DIR / "imports" / "successful_imports"
@@ -257,6 +281,7 @@ os.makedirs(IMPORT_LOGS, exist_ok=True)
 
 # transferring session storage to Redis
 SESSION_ENGINE = "redis_sessions.session"
+SESSION_SERIALIZER = "config.session_serializer.MsgPackSerializer"
 url = urlparse(REDIS_URL)
 SESSION_REDIS = {
     "host": url.hostname,
@@ -10,7 +10,7 @@ class ShopDiscountAdmin(admin.ModelAdmin):
     """Класс для отображения скидок на товары в магазине"""
 
     form = ShopDiscountCreationForm
-    list_display = ("name", "active", "formatted_last_time")
+    list_display = ("name", "enabled", "active", "formatted_last_time")
     search_fields = ["name"]
     fieldsets = (
         (
@@ -30,7 +30,7 @@ class ShopDiscountAdmin(admin.ModelAdmin):
             _("Скидка на группу товаров"),
             {"fields": ("products", "categories")},
         ),
-        (_("Активировать скидку"), {"fields": ("active",)}),
+        (_("Активировать скидку"), {"fields": ("enabled",)}),
     )
 
     def formatted_last_time(self, obj):
@@ -45,7 +45,7 @@ class CartDiscountAdmin(admin.ModelAdmin):
     """Класс для отображения скидок на товары в корзине"""
 
     form = CartDiscountCreationForm
-    list_display = ("name", "active", "formatted_last_time")
+    list_display = ("name", "enabled", "active", "formatted_last_time")
     search_fields = ["name"]
 
     fieldsets = (
@@ -75,7 +75,7 @@ class CartDiscountAdmin(admin.ModelAdmin):
                 )
             },
         ),
-        (_("Активировать скидку"), {"fields": ("active",)}),
+        (_("Активировать скидку"), {"fields": ("enabled",)}),
     )
 
     def formatted_last_time(self, obj):
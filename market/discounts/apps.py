@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DiscountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "discounts"
+
+    def ready(self):
+        # Implicitly connect signal handlers decorated with @receiver.
+        from . import signals  # noqa F401
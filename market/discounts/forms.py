@@ -11,7 +11,7 @@ class ShopDiscountCreationForm(forms.ModelForm):
 
     class Meta:
         model = ShopItemDiscount
-        fields = "__all__"
+        exclude = ["active"]
 
     def clean(self):
         """Функция проверки введенных данных"""
@@ -45,7 +45,7 @@ class CartDiscountCreationForm(ShopDiscountCreationForm):
 
     class Meta:
         model = CartItemDiscount
-        fields = "__all__"
+        exclude = ["active"]
 
     def clean(self):
         """Функция проверки введенных данных"""
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from discounts.services.price_materializer import rebuild_discount_prices
+
+
+class Command(BaseCommand):
+    """Полный пересчет цен со скидкой для всех предложений и сводных цен продуктов"""
+
+    help = "Пересчитывает Offer.discount_price для всех предложений и сводные цены продуктов"
+
+    def handle(self, *args, **options):
+        updated = rebuild_discount_prices()
+        self.stdout.write(self.style.SUCCESS(f"Обновлено предложений: {updated}"))
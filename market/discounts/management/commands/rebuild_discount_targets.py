@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from discounts.services.targets import rebuild_discount_targets
+
+
+class Command(BaseCommand):
+    """Полное пересоздание денормализованных целей скидок"""
+
+    help = "Пересоздает строки DiscountTarget по текущим скидкам, их продуктам и категориям"
+
+    def handle(self, *args, **options):
+        created = rebuild_discount_targets()
+        self.stdout.write(self.style.SUCCESS(f"Создано строк целей скидок: {created}"))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from discounts.services.simulator import simulate
+
+
+class Command(BaseCommand):
+    """Прогон движка скидок на синтетическом каталоге с проверкой по эталонному расчету"""
+
+    help = "Выводит корзин в секунду, p50/p99 задержки и запросы движка скидок и расхождения с эталоном"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20, help="Количество категорий")
+        parser.add_argument("--products", type=int, default=2000, help="Количество продуктов")
+        parser.add_argument("--shop-discounts", type=int, default=200, help="Скидок на товары в магазине")
+        parser.add_argument("--cart-discounts", type=int, default=200, help="Скидок на товары в корзине")
+        parser.add_argument("--carts", type=int, default=5000, help="Количество корзин")
+        parser.add_argument("--lines", type=int, default=10, help="Максимум продуктов в корзине")
+        parser.add_argument("--check", type=int, default=500, help="Корзин для сверки с эталоном")
+        parser.add_argument("--seed", type=int, default=1, help="Зерно генератора")
+
+    def handle(self, *args, **options):
+        report = simulate(
+            categories=options["categories"],
+            products=options["products"],
+            shop_discounts=options["shop_discounts"],
+            cart_discounts=options["cart_discounts"],
+            carts=options["carts"],
+            max_lines=options["lines"],
+            check=options["check"],
+            seed_value=options["seed"],
+        )
+        for title in ("engine", "cached", "reference"):
+            stats = report[title]
+            self.stdout.write(
+                f"{title}: корзин {stats['carts']}, {stats['carts_per_sec']:.0f} корзин/с, "
+                f"p50 {stats['p50_ms']:.3f} мс, p99 {stats['p99_ms']:.3f} мс, запросов {stats['queries']}"
+            )
+        style = self.style.SUCCESS if not report["mismatches"] else self.style.ERROR
+        self.stdout.write(style(f"Расхождений с эталоном: {report['mismatches']}"))
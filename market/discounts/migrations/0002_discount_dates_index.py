@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("discounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="cartitemdiscount",
+            name="end_date",
+            field=models.DateTimeField(db_index=True, verbose_name="дата окончания действия скидки"),
+        ),
+        migrations.AlterField(
+            model_name="cartitemdiscount",
+            name="start_date",
+            field=models.DateTimeField(db_index=True, verbose_name="дата начала действия скидки"),
+        ),
+        migrations.AlterField(
+            model_name="shopitemdiscount",
+            name="end_date",
+            field=models.DateTimeField(db_index=True, verbose_name="дата окончания действия скидки"),
+        ),
+        migrations.AlterField(
+            model_name="shopitemdiscount",
+            name="start_date",
+            field=models.DateTimeField(db_index=True, verbose_name="дата начала действия скидки"),
+        ),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_targets(apps, schema_editor):
+    """Строки целей для уже существующих скидок"""
+    DiscountTarget = apps.get_model("discounts", "DiscountTarget")
+    fields = ("active", "start_date", "end_date", "discount_amount", "discount_amount_type")
+    for kind, model_name in ((1, "ShopItemDiscount"), (2, "CartItemDiscount")):
+        model = apps.get_model("discounts", model_name)
+        targets = []
+        for discount in model.objects.prefetch_related("products", "categories"):
+            values = {field: getattr(discount, field) for field in fields}
+            if kind == 2:
+                values.update(
+                    total_price_of_cart=discount.total_price_of_cart,
+                    amount_product_in_cart=discount.amount_product_in_cart,
+                )
+            links = [{"product_id": product.id} for product in discount.products.all()]
+            links += [{"category_id": category.id} for category in discount.categories.all()]
+            targets += [
+                DiscountTarget(discount_type=kind, discount_id=discount.id, **values, **link) for link in links or [{}]
+            ]
+        DiscountTarget.objects.bulk_create(targets, batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("catalog", "0003_product_search"),
+        ("products", "0002_product_name_trigram_index"),
+        ("discounts", "0002_discount_dates_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscountTarget",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "discount_type",
+                    models.PositiveSmallIntegerField(
+                        choices=[(1, "скидка на товар в магазине"), (2, "скидка на товар в корзине")],
+                        verbose_name="модель скидки",
+                    ),
+                ),
+                ("discount_id", models.PositiveBigIntegerField(verbose_name="id скидки")),
+                ("active", models.BooleanField(verbose_name="скидка активна")),
+                ("start_date", models.DateTimeField(verbose_name="дата начала действия скидки")),
+                ("end_date", models.DateTimeField(verbose_name="дата окончания действия скидки")),
+                (
+                    "discount_amount",
+                    models.DecimalField(decimal_places=2, max_digits=10, verbose_name="размер скидки"),
+                ),
+                ("discount_amount_type", models.PositiveSmallIntegerField(choices=[(1, "проценты"), (2, "сумма")])),
+                (
+                    "total_price_of_cart",
+                    models.DecimalField(
+                        decimal_places=2, max_digits=10, null=True, verbose_name="Минимальная цена товаров в корзине"
+                    ),
+                ),
+                (
+                    "amount_product_in_cart",
+                    models.PositiveIntegerField(null=True, verbose_name="Минимальное количество товаров в корзине"),
+                ),
+                (
+                    "category",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="catalog.catalog",
+                        verbose_name="категория товаров",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="products.product",
+                        verbose_name="товар",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "цель скидки",
+                "verbose_name_plural": "цели скидок",
+                "indexes": [
+                    models.Index(fields=["product", "active"], name="discount_target_product"),
+                    models.Index(fields=["category", "active"], name="discount_target_category"),
+                    models.Index(fields=["discount_type", "discount_id"], name="discount_target_discount"),
+                    models.Index(fields=["active", "start_date", "end_date"], name="discount_target_window"),
+                ],
+            },
+        ),
+        migrations.RunPython(fill_targets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:23
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def disable_switched_off(apps, schema_editor):
+    """Неактивная скидка, период действия которой уже начался, была выключена вручную"""
+    for model_name in ("ShopItemDiscount", "CartItemDiscount"):
+        apps.get_model("discounts", model_name).objects.filter(active=False, start_date__lte=timezone.now()).update(
+            enabled=False
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("discounts", "0003_discount_target"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cartitemdiscount",
+            name="enabled",
+            field=models.BooleanField(
+                default=True,
+                help_text="Включенная скидка активна в период действия, выключенная не активируется по расписанию",
+                verbose_name="скидка включена",
+            ),
+        ),
+        migrations.AddField(
+            model_name="shopitemdiscount",
+            name="enabled",
+            field=models.BooleanField(
+                default=True,
+                help_text="Включенная скидка активна в период действия, выключенная не активируется по расписанию",
+                verbose_name="скидка включена",
+            ),
+        ),
+        migrations.RunPython(disable_switched_off, migrations.RunPython.noop),
+    ]
@@ -4,8 +4,6 @@ from django.utils import timezone
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
-from catalog.price_and_discounts import check_discount_price
-
 
 class StatusDiscount(models.IntegerChoices):
     """Класс для выбора вида скидки"""
@@ -31,8 +29,17 @@ class Discount(models.Model):
     )
     discount_amount_type = models.PositiveSmallIntegerField(choices=StatusDiscount.choices, null=False, blank=False)
     active = models.BooleanField(verbose_name=_("скидка активна"), null=False, blank=False)
-    start_date = models.DateTimeField(null=False, blank=False, verbose_name=_("дата начала действия скидки"))
-    end_date = models.DateTimeField(null=False, blank=False, verbose_name=_("дата окончания действия скидки"))
+    enabled = models.BooleanField(
+        default=True,
+        verbose_name=_("скидка включена"),
+        help_text=_("Включенная скидка активна в период действия, выключенная не активируется по расписанию"),
+    )
+    start_date = models.DateTimeField(
+        null=False, blank=False, db_index=True, verbose_name=_("дата начала действия скидки")
+    )
+    end_date = models.DateTimeField(
+        null=False, blank=False, db_index=True, verbose_name=_("дата окончания действия скидки")
+    )
 
     products = models.ManyToManyField(
         "products.Product",
@@ -53,22 +60,16 @@ class Discount(models.Model):
 
     @property
     def last_discount_time(self):
-        """Метод для времени до даты истечения скидки"""
-        current_time = timezone.now()
-        last_time = self.end_date - current_time
-        if self.active:
-            if last_time.total_seconds() <= 0:
-                self.active = False
-                self.save()
-                last_time = timedelta(seconds=0)
-        else:
-            last_time = timedelta(seconds=0)
-
-        return last_time
+        """Метод для времени до даты истечения скидки. Скидки включает и выключает расписание,
+        поэтому чтение ничего не записывает"""
+        if not self.active:
+            return timedelta(seconds=0)
+        return max(self.end_date - timezone.now(), timedelta(seconds=0))
 
     def save(self, *args, **kwargs):
-        self.active = self.last_discount_time.total_seconds() > 0
-        check_discount_price()
+        """Скидка активна, если она включена и идет период ее действия. В дату начала включенную скидку
+        активирует расписание, флаг enabled при этом не меняется"""
+        self.active = self.enabled and self.start_date <= timezone.now() < self.end_date
         super().save(*args, **kwargs)
 
 
@@ -102,3 +103,58 @@ class CartItemDiscount(Discount):
         verbose_name=_("Минимальное количество товаров в корзине"),
         help_text=_("Скидка может быть установлена на количество товаров в корзине."),
     )
+
+
+class DiscountKind(models.IntegerChoices):
+    """Класс для выбора модели скидки"""
+
+    shop = 1, _("скидка на товар в магазине")
+    cart = 2, _("скидка на товар в корзине")
+
+
+class DiscountTarget(models.Model):
+    """
+    Денормализованные связи скидок с продуктами и категориями.
+    Строка на каждый продукт и каждую категорию скидки, скидка без продуктов и категорий - одна строка без них.
+    Условия скидки скопированы в строки, поэтому подходящие корзине скидки выбираются одним запросом по индексам
+    """
+
+    class Meta:
+        verbose_name = _("цель скидки")
+        verbose_name_plural = _("цели скидок")
+        indexes = [
+            models.Index(fields=["product", "active"], name="discount_target_product"),
+            models.Index(fields=["category", "active"], name="discount_target_category"),
+            models.Index(fields=["discount_type", "discount_id"], name="discount_target_discount"),
+            models.Index(fields=["active", "start_date", "end_date"], name="discount_target_window"),
+        ]
+
+    discount_type = models.PositiveSmallIntegerField(choices=DiscountKind.choices, verbose_name=_("модель скидки"))
+    discount_id = models.PositiveBigIntegerField(verbose_name=_("id скидки"))
+    product = models.ForeignKey(
+        "products.Product",
+        null=True,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("товар"),
+    )
+    category = models.ForeignKey(
+        "catalog.Catalog",
+        null=True,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("категория товаров"),
+    )
+    active = models.BooleanField(verbose_name=_("скидка активна"))
+    start_date = models.DateTimeField(verbose_name=_("дата начала действия скидки"))
+    end_date = models.DateTimeField(verbose_name=_("дата окончания действия скидки"))
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("размер скидки"))
+    discount_amount_type = models.PositiveSmallIntegerField(choices=StatusDiscount.choices)
+    total_price_of_cart = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, verbose_name=_("Минимальная цена товаров в корзине")
+    )
+    amount_product_in_cart = models.PositiveIntegerField(
+        null=True, verbose_name=_("Минимальное количество товаров в корзине")
+    )
@@ -1,32 +1,83 @@
-from django.db.models import Q
-from discounts.models import CartItemDiscount
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from discounts.services.rule_table import get_rule_table
 from cart.cart import Cart
 
+PRICING_KEY = "discounts.pricing.{version}.{digest}"
+CENTS = Decimal("0.01")
+
+
+def percent_discount(price, percent) -> Decimal:
+    """Процентная скидка от цены, округленная до копеек. Считается в Decimal без перехода к float"""
+    return (Decimal(price) * Decimal(percent) / 100).quantize(CENTS)
+
 
 class DiscountService:
-    """Класс для расчета скидок на товары в корзине"""
+    """Класс для расчета скидок на товары в корзине.
+    Скидки берутся из таблицы правил процесса, поэтому расчет не выполняет запросов к бд.
+    Расчет ведется от цен без скидки, сумма корзины считается по тем же ценам.
+    Результат расчета кэшируется по составу корзины и версии правил и считается только при обращении"""
 
     def __init__(self, cart: Cart):
         self.cart = cart
+        self.rules = get_rule_table()
         self.products = self.cart.get_products()
-        self.total_price = self.cart.get_total_price()
+        self.total_price = sum(values["pcs"] * values["unit_price"] for values in self.products.values())
         self.total_quantity = self.cart.get_products_quantity()
         self._products_wit_shop_discount = dict()
         self._products_wit_cart_discount = dict()
-        self._total_price_with_discount = self._get_max_discount()
 
     @property
     def get_product_with_new_price(self) -> dict:
         """Метод возвращает словарь с продуктами, которые получили скидки"""
-        return self._products_wit_shop_discount or self._products_wit_cart_discount
+        products = {product.id: product for product in self.products}
+        return {products[product_id]: price for product_id, price in self.pricing["products"].items()}
 
     @property
     def get_total_price_with_discount(self):
         """ "Метод возвращает итоговую стоимость корзины с учетом скидки"""
-        return self._total_price_with_discount
+        return self.pricing["total_price"]
+
+    @cached_property
+    def pricing(self) -> dict:
+        """Расчет скидок корзины: {"total_price": цена со скидкой, "products": {id продукта: новая цена}}.
+        Одинаковые корзины разных запросов и пользователей используют один результат из кэша"""
+        key = self.pricing_key()
+        pricing = cache.get(key)
+        if pricing is None:
+            pricing = self.calculate()
+            cache.set(key, pricing, settings.CACHE_TIME_PER_DAY)
+        return pricing
+
+    def calculate(self) -> dict:
+        """Расчет скидок корзины без кэша"""
+        self._products_wit_shop_discount = dict()
+        self._products_wit_cart_discount = dict()
+        total_price = self._get_max_discount()
+        products = self._products_wit_shop_discount or self._products_wit_cart_discount
+        return {
+            "total_price": total_price,
+            "products": {product.id: price for product, price in products.items()},
+        }
+
+    def pricing_key(self) -> str:
+        """Ключ кэша расчета по строкам корзины (продукт, категория, количество, цена) и версии правил"""
+        lines = sorted(
+            (product.id, product.category_id, values.get("pcs"), str(values.get("unit_price")))
+            for product, values in self.products.items()
+        )
+        content = [lines, str(self.total_price), self.total_quantity]
+        digest = hashlib.md5(json.dumps(content).encode()).hexdigest()
+        return PRICING_KEY.format(version=self.rules.version, digest=digest)
 
-    def discounts_handler(self, discounts, values, **kwargs):
-        """Метод для получения списка скидок на товар"""
+    def discounts_handler(self, discounts, values, condition=None):
+        """Метод для получения максимальной скидки на товар из подходящих под условие правил"""
         products_quantity = values.get("pcs")
         product_price = values.get("unit_price")
 
@@ -35,8 +86,9 @@ class DiscountService:
                 [
                     discount.discount_amount
                     if discount.discount_amount_type == 2
-                    else round(product_price / 100 * float(discount.discount_amount), 2)
-                    for discount in discounts.filter(active=True, **kwargs)
+                    else percent_discount(product_price, discount.discount_amount)
+                    for discount in discounts
+                    if condition is None or condition(discount)
                 ],
                 default=0,
             )
@@ -52,8 +104,10 @@ class DiscountService:
             products_quantity = values.get("pcs")
             product_price = values.get("unit_price")
             total_units_price = products_quantity * product_price
-            product_discount = self.discounts_handler(product.shopitemdiscount, values)
-            category_discount = self.discounts_handler(product.category.shopitemdiscount, values)
+            product_discount = self.discounts_handler(self.rules.shop_by_product.get(product.id, []), values)
+            category_discount = self.discounts_handler(
+                self.rules.shop_by_category.get(product.category_id, []), values
+            )
 
             if product_discount or category_discount:
                 products_discount = max(product_discount, category_discount)
@@ -72,31 +126,29 @@ class DiscountService:
 
         cart_products_discount = {}
 
-        categories = {product.category for product in self.products.keys()}
+        categories = {product.category_id for product in self.products.keys()}
+        total_price, total_quantity = self.total_price, self.total_quantity
+
+        def in_categories(rule):
+            return not rule.category_ids.isdisjoint(categories)
+
+        def price_reached(rule):
+            return rule.total_price_of_cart is not None and rule.total_price_of_cart >= total_price
+
+        def quantity_reached(rule):
+            return rule.amount_product_in_cart is not None and rule.amount_product_in_cart >= total_quantity
 
         for product, values in self.products.items():
-            var1 = self.discounts_handler(product.cartitemdiscount, values, categories__in=categories)
+            discounts = [rule for rule in self.rules.cart_by_product.get(product.id, []) if in_categories(rule)]
+            var1 = self.discounts_handler(discounts, values)
             var2 = self.discounts_handler(
-                product.cartitemdiscount,
-                values,
-                categories__in=categories,
-                total_price_of_cart__gte=self.total_price,
-                amount_product_in_cart__gte=self.total_quantity,
+                discounts, values, lambda rule: price_reached(rule) and quantity_reached(rule)
             )
             var3 = self.discounts_handler(
-                product.cartitemdiscount,
-                values,
-                categories__in=categories,
-                total_price_of_cart=None,
-                amount_product_in_cart__gte=self.total_quantity,
+                discounts, values, lambda rule: rule.total_price_of_cart is None and quantity_reached(rule)
             )
-
             var4 = self.discounts_handler(
-                product.cartitemdiscount,
-                values,
-                categories__in=categories,
-                total_price_of_cart__gte=self.total_price,
-                amount_product_in_cart=None,
+                discounts, values, lambda rule: price_reached(rule) and rule.amount_product_in_cart is None
             )
 
             if var1 or var2 or var3 or var4:
@@ -113,31 +165,24 @@ class DiscountService:
     def _get_cart_discount(self) -> int:
         """Метод для расчета максимальной скидки из всех возможных скидок для корзины"""
 
-        common_kwargs = {"active": True, "products": None, "categories": None}
-
-        discount_for_cart = CartItemDiscount.objects.filter(
-            Q(
-                **common_kwargs,
-                total_price_of_cart=None,
-                amount_product_in_cart__lte=self.total_quantity,
-            )
-            | Q(
-                **common_kwargs,
-                total_price_of_cart__lte=self.total_price,
-                amount_product_in_cart__lte=self.total_quantity,
+        def applies(rule):
+            price_reached = rule.total_price_of_cart is not None and rule.total_price_of_cart <= self.total_price
+            quantity_reached = (
+                rule.amount_product_in_cart is not None and rule.amount_product_in_cart <= self.total_quantity
             )
-            | Q(
-                **common_kwargs,
-                total_price_of_cart__lte=self.total_price,
-                amount_product_in_cart=None,
+            return (
+                (rule.total_price_of_cart is None and quantity_reached)
+                or (price_reached and quantity_reached)
+                or (price_reached and rule.amount_product_in_cart is None)
             )
-        )
+
+        discount_for_cart = [rule for rule in self.rules.cart_wide if applies(rule)]
 
         max_cart_discount = max(
             [
                 discount.discount_amount
                 if discount.discount_amount_type == 2
-                else round(self.total_price / 100 * float(discount.discount_amount), 2)
+                else percent_discount(self.total_price, discount.discount_amount)
                 for discount in discount_for_cart
             ],
             default=0,
@@ -0,0 +1,76 @@
+from django.db import transaction
+from django.db.models import Q
+
+from cart.cart import mark_carts_stale
+from catalog.price_and_discounts import delete_empty_price_summaries, refresh_price_summaries
+from shops.models import Offer
+from shops.services.offer_discount import BulkOfferDiscount
+
+BATCH_SIZE = 500
+
+
+def affected_offers(offer_ids=(), product_ids=(), category_ids=()):
+    """Возвращает предложения, на цену которых влияют указанные предложения, продукты и категории"""
+    return Offer.objects.filter(
+        Q(id__in=offer_ids) | Q(product_id__in=product_ids) | Q(product__category_id__in=category_ids)
+    )
+
+
+def discount_targets(discount) -> (set, set):
+    """Возвращает id продуктов и категорий, на которые распространяется скидка"""
+    product_ids = set(discount.products.values_list("id", flat=True))
+    category_ids = set(discount.categories.values_list("id", flat=True))
+    return product_ids, category_ids
+
+
+def refresh_discount_prices(offers) -> int:
+    """Пересчитывает цену со скидкой для переданных предложений и сводные цены их продуктов.
+    Изменившиеся цены записываются пачками через bulk_update, возвращается количество обновленных предложений"""
+    updated = 0
+    chunk = []
+    for offer in offers.select_related("product").iterator(chunk_size=BATCH_SIZE):
+        chunk.append(offer)
+        if len(chunk) == BATCH_SIZE:
+            updated += _refresh_chunk(chunk)
+            chunk = []
+    return updated + _refresh_chunk(chunk)
+
+
+def _refresh_chunk(offers: list) -> int:
+    """Пересчет цен для пачки предложений, скидки получаются одним набором запросов.
+    У предложений с изменившейся ценой увеличивается версия цены, а строки корзин с ними помечаются устаревшими"""
+    BulkOfferDiscount(offers)()
+    changed = []
+    for offer in offers:
+        discount_price = offer.price_with_discount
+        if offer.discount_price != discount_price:
+            offer.discount_price = discount_price
+            offer.price_version += 1
+            changed.append(offer)
+    Offer.objects.bulk_update(changed, ["discount_price", "price_version"])
+    if changed:
+        mark_carts_stale(offer.id for offer in changed)
+    refresh_price_summaries({offer.product_id for offer in offers})
+    return len(changed)
+
+
+def schedule_refresh(offer_ids=(), product_ids=(), category_ids=()) -> None:
+    """Откладывает пересчет цен до фиксации текущей транзакции"""
+    offer_ids, product_ids, category_ids = set(offer_ids), set(product_ids), set(category_ids)
+    if not (offer_ids or product_ids or category_ids):
+        return
+    transaction.on_commit(lambda: refresh_discount_prices(affected_offers(offer_ids, product_ids, category_ids)))
+
+
+def schedule_summary_refresh(product_ids) -> None:
+    """Откладывает пересчет сводных цен продуктов до фиксации текущей транзакции"""
+    product_ids = set(product_ids)
+    transaction.on_commit(lambda: refresh_price_summaries(product_ids))
+
+
+def rebuild_discount_prices() -> int:
+    """Полный пересчет цен со скидкой для всех предложений и сводных цен продуктов.
+    Предложения обходятся по продуктам, чтобы сводная цена продукта считалась после пересчета всех его предложений"""
+    updated = refresh_discount_prices(Offer.objects.order_by("product_id", "id"))
+    delete_empty_price_summaries()
+    return updated
@@ -0,0 +1,92 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+from itertools import groupby
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+from discounts.models import DiscountKind, DiscountTarget
+
+VERSION_KEY = "discounts.rules.version"
+
+_table = None
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Скомпилированное правило скидки"""
+
+    id: int
+    discount_amount: Decimal
+    discount_amount_type: int
+    category_ids: frozenset = frozenset()
+    total_price_of_cart: Decimal = None
+    amount_product_in_cart: int = None
+
+
+class RuleTable:
+    """Активные скидки, разложенные по id продуктов и категорий.
+    Расчет скидок корзины по таблице не требует запросов к бд"""
+
+    def __init__(self, version: str):
+        self.version = version
+        self.shop_by_product = defaultdict(list)
+        self.shop_by_category = defaultdict(list)
+        self.cart_by_product = defaultdict(list)
+        self.cart_wide = []
+
+    def load(self) -> "RuleTable":
+        """Загрузка активных скидок одним запросом по денормализованным целям скидок"""
+        targets = DiscountTarget.objects.filter(active=True).order_by("discount_type", "discount_id", "id")
+        for (kind, _), rows in groupby(targets, key=lambda target: (target.discount_type, target.discount_id)):
+            rows = list(rows)
+            product_ids = [row.product_id for row in rows if row.product_id is not None]
+            category_ids = frozenset(row.category_id for row in rows if row.category_id is not None)
+            if kind == DiscountKind.shop:
+                rule = Rule(rows[0].discount_id, rows[0].discount_amount, rows[0].discount_amount_type)
+                for product_id in product_ids:
+                    self.shop_by_product[product_id].append(rule)
+                for category_id in category_ids:
+                    self.shop_by_category[category_id].append(rule)
+                continue
+            rule = Rule(
+                rows[0].discount_id,
+                rows[0].discount_amount,
+                rows[0].discount_amount_type,
+                category_ids=category_ids,
+                total_price_of_cart=rows[0].total_price_of_cart,
+                amount_product_in_cart=rows[0].amount_product_in_cart,
+            )
+            for product_id in product_ids:
+                self.cart_by_product[product_id].append(rule)
+            if not product_ids and not category_ids:
+                self.cart_wide.append(rule)
+        return self
+
+
+def rules_version() -> str:
+    """Текущая версия правил скидок. Версия случайная, а не счетчик: после сброса кэша
+    новая версия не совпадет с версией уже собранных в процессах таблиц"""
+    return cache.get_or_set(VERSION_KEY, lambda: uuid4().hex, None)
+
+
+def get_rule_table() -> RuleTable:
+    """Таблица правил процесса. Пересобирается, только если версия правил в кэше изменилась.
+    Версия читается до загрузки, поэтому изменение во время сборки приведет к повторной сборке"""
+    global _table
+    version = rules_version()
+    if _table is None or _table.version != version:
+        _table = RuleTable(version).load()
+    return _table
+
+
+def reset_rules_version() -> None:
+    """Смена версии правил: таблицы всех процессов будут собраны заново при следующем обращении"""
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def bump_rules_version() -> None:
+    """Смена версии правил после фиксации транзакции, в которой изменились скидки"""
+    transaction.on_commit(reset_rules_version)
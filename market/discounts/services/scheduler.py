@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from discounts.models import CartItemDiscount, ShopItemDiscount
+from discounts.services.price_materializer import schedule_refresh
+from discounts.services.rule_table import bump_rules_version
+from discounts.services.targets import set_targets_active
+
+NEXT_KEY = "discounts.schedule.next"
+DISCOUNT_MODELS = (ShopItemDiscount, CartItemDiscount)
+
+
+def apply_discount_schedule(now=None) -> dict:
+    """
+    Активирует включенные скидки, период действия которых начался, и деактивирует истекшие.
+    Выключенные вручную скидки (enabled=False) не активируются.
+    На каждую границу и модель скидок выполняется один UPDATE, после чего правила меняются одним событием:
+    новой версией таблицы правил и пересчетом цен затронутых предложений.
+    Возвращает количество включенных и выключенных скидок
+    """
+    now = now or timezone.now()
+    totals = {"activated": 0, "expired": 0}
+    changed_shop_discounts = set()
+    with transaction.atomic():
+        for model in DISCOUNT_MODELS:
+            starting = model.objects.filter(enabled=True, active=False, start_date__lte=now, end_date__gt=now)
+            ending = model.objects.filter(active=True, end_date__lte=now)
+            for name, discounts, active in (("activated", starting, True), ("expired", ending, False)):
+                discount_ids = list(discounts.values_list("id", flat=True))
+                if not discount_ids:
+                    continue
+                totals[name] += model.objects.filter(id__in=discount_ids).update(active=active)
+                set_targets_active(model, discount_ids, active)
+                if model is ShopItemDiscount:
+                    changed_shop_discounts.update(discount_ids)
+        if totals["activated"] or totals["expired"]:
+            _rules_changed(changed_shop_discounts)
+    return totals
+
+
+def _rules_changed(shop_discount_ids: set) -> None:
+    """Событие изменения правил: смена версии таблицы правил и пересчет цен со скидкой"""
+    bump_rules_version()
+    through = ShopItemDiscount.products.through
+    product_ids = through.objects.filter(shopitemdiscount_id__in=shop_discount_ids).values_list(
+        "product_id", flat=True
+    )
+    through = ShopItemDiscount.categories.through
+    category_ids = through.objects.filter(shopitemdiscount_id__in=shop_discount_ids).values_list(
+        "catalog_id", flat=True
+    )
+    schedule_refresh(product_ids=product_ids, category_ids=category_ids)
+
+
+def next_boundary(now=None):
+    """Ближайшая граница расписания: дата начала включенной неактивной или окончания активной скидки.
+    Ищется по индексам дат, поэтому расписание не хранится отдельно от скидок"""
+    now = now or timezone.now()
+    boundaries = []
+    for model in DISCOUNT_MODELS:
+        boundaries.append(
+            model.objects.filter(
+                enabled=True, active=False, start_date__gt=now, end_date__gt=F("start_date")
+            ).aggregate(boundary=Min("start_date"))["boundary"]
+        )
+        boundaries.append(model.objects.filter(active=True).aggregate(boundary=Min("end_date"))["boundary"])
+    return min(filter(None, boundaries), default=None)
+
+
+def schedule_next_boundary(now=None) -> None:
+    """Ставит задачу применения расписания на ближайшую границу, если на нее задача еще не поставлена"""
+    from discounts.tasks import run_discount_schedule
+
+    now = now or timezone.now()
+    boundary = next_boundary(now)
+    if boundary is None:
+        return
+    scheduled = cache.get(NEXT_KEY)
+    if scheduled is not None and now < scheduled <= boundary:
+        return
+    cache.set(NEXT_KEY, boundary, None)
+    transaction.on_commit(lambda: run_discount_schedule.apply_async(eta=boundary))
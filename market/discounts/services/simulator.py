@@ -0,0 +1,246 @@
+import random
+import time
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from catalog.models import Catalog
+from discounts.models import CartItemDiscount, ShopItemDiscount
+from discounts.services.discountservice import CENTS, DiscountService, percent_discount
+from discounts.services.rule_table import reset_rules_version
+from discounts.services.targets import sync_discount_targets
+from products.models import Product
+
+BATCH_SIZE = 1000
+
+
+class SimulatedCart:
+    """Корзина с интерфейсом Cart, который использует DiscountService, без сессии и запросов"""
+
+    def __init__(self, products: dict):
+        self.products = products
+
+    def get_products(self) -> dict:
+        return self.products
+
+    def get_total_price(self):
+        return sum(values["pcs"] * values["unit_price"] for values in self.products.values())
+
+    def get_products_quantity(self) -> int:
+        return sum(values["pcs"] for values in self.products.values())
+
+
+def seed(rng: random.Random, categories: int, products: int, shop_discounts: int, cart_discounts: int) -> list:
+    """Синтетический каталог и набор скидок. Скидки привязываются к продуктам, категориям,
+    к тем и другим или ни к чему. Возвращает продукты каталога"""
+    now = timezone.now()
+    categories = Catalog.objects.bulk_create(
+        Catalog(name=f"simulation {number}", slug=f"simulation-{number}") for number in range(categories)
+    )
+    products = Product.objects.bulk_create(
+        (Product(name=f"simulation {number}", category=rng.choice(categories)) for number in range(products)),
+        batch_size=BATCH_SIZE,
+    )
+    for model, count in ((ShopItemDiscount, shop_discounts), (CartItemDiscount, cart_discounts)):
+        discounts = model.objects.bulk_create(
+            (model(**discount_fields(rng, model, now)) for _ in range(count)), batch_size=BATCH_SIZE
+        )
+        field = f"{model._meta.model_name}_id"
+        product_links, category_links = [], []
+        for discount in discounts:
+            targets = rng.choice(("products", "categories", "both", "none"))
+            if targets in ("products", "both"):
+                product_links += [
+                    model.products.through(**{field: discount.id, "product_id": product.id})
+                    for product in rng.sample(products, min(len(products), rng.randint(1, 5)))
+                ]
+            if targets in ("categories", "both"):
+                category_links += [
+                    model.categories.through(**{field: discount.id, "catalog_id": category.id})
+                    for category in rng.sample(categories, min(len(categories), rng.randint(1, 2)))
+                ]
+        model.products.through.objects.bulk_create(product_links, batch_size=BATCH_SIZE)
+        model.categories.through.objects.bulk_create(category_links, batch_size=BATCH_SIZE)
+        sync_discount_targets(model, [discount.id for discount in discounts])
+    reset_rules_version()
+    return products
+
+
+def discount_fields(rng: random.Random, model, now) -> dict:
+    """Случайные условия скидки, действующей сейчас"""
+    amount_type = rng.choice((1, 2))
+    fields = {
+        "name": "simulation",
+        "description": "simulation",
+        "discount_amount": Decimal(rng.randint(1, 50) if amount_type == 1 else rng.randint(10, 500)),
+        "discount_amount_type": amount_type,
+        "active": rng.random() < 0.9,
+        "start_date": now - timezone.timedelta(days=1),
+        "end_date": now + timezone.timedelta(days=1),
+    }
+    if model is CartItemDiscount:
+        fields["total_price_of_cart"] = rng.choice((None, Decimal(rng.randint(100, 20000))))
+        fields["amount_product_in_cart"] = rng.choice((None, rng.randint(1, 20)))
+    return fields
+
+
+def generate_carts(rng: random.Random, products: list, count: int, max_lines: int) -> list:
+    """Случайные корзины из 1..max_lines продуктов с целыми ценами"""
+    return [
+        SimulatedCart(
+            {
+                product: {"pcs": rng.randint(1, 5), "unit_price": rng.randint(100, 5000)}
+                for product in rng.sample(products, rng.randint(1, min(max_lines, len(products))))
+            }
+        )
+        for _ in range(count)
+    ]
+
+
+def reference_pricing(cart) -> dict:
+    """Эталонный расчет скидок прежним способом: отдельными запросами скидок по каждому продукту корзины"""
+    products = cart.get_products()
+    total_price = cart.get_total_price()
+    total_quantity = cart.get_products_quantity()
+
+    def handler(discounts, values, **kwargs):
+        return (
+            max(
+                [
+                    discount.discount_amount
+                    if discount.discount_amount_type == 2
+                    else percent_discount(values["unit_price"], discount.discount_amount)
+                    for discount in discounts.filter(active=True, **kwargs)
+                ],
+                default=0,
+            )
+            * values["pcs"]
+        )
+
+    shop_discounts, shop_prices = {}, {}
+    for product, values in products.items():
+        units_price = values["pcs"] * values["unit_price"]
+        discount = max(handler(product.shopitemdiscount, values), handler(product.category.shopitemdiscount, values))
+        if discount:
+            shop_discounts[product] = discount
+            shop_prices[product.id] = units_price - discount if units_price > discount else 1
+    max_shop_discount = sum(shop_discounts.values())
+
+    categories = {product.category for product in products}
+    conditions = (
+        {},
+        {"total_price_of_cart__gte": total_price, "amount_product_in_cart__gte": total_quantity},
+        {"total_price_of_cart": None, "amount_product_in_cart__gte": total_quantity},
+        {"total_price_of_cart__gte": total_price, "amount_product_in_cart": None},
+    )
+    cart_discounts, cart_prices = {}, {}
+    for product, values in products.items():
+        variants = [
+            handler(product.cartitemdiscount, values, categories__in=categories, **condition)
+            for condition in conditions
+        ]
+        if any(variants):
+            cart_discounts[product] = max(variants)
+            unit_price = values["unit_price"]
+            cart_prices[product.id] = unit_price - max(variants) if unit_price > max(variants) else 1
+    common = {"active": True, "products": None, "categories": None}
+    cart_wide = CartItemDiscount.objects.filter(
+        Q(**common, total_price_of_cart=None, amount_product_in_cart__lte=total_quantity)
+        | Q(**common, total_price_of_cart__lte=total_price, amount_product_in_cart__lte=total_quantity)
+        | Q(**common, total_price_of_cart__lte=total_price, amount_product_in_cart=None)
+    )
+    max_cart_discount = max(
+        max(
+            [
+                discount.discount_amount
+                if discount.discount_amount_type == 2
+                else percent_discount(total_price, discount.discount_amount)
+                for discount in cart_wide
+            ],
+            default=0,
+        ),
+        sum(cart_discounts.values()),
+    )
+
+    if max_shop_discount > max_cart_discount:
+        cart_prices = {}
+        total = len(shop_prices) if max_shop_discount > total_price else total_price - max_shop_discount
+    else:
+        total = 1 if max_cart_discount > total_price else total_price - max_cart_discount
+    return {"total_price": total, "products": shop_prices or cart_prices}
+
+
+def measure(carts: list, price) -> dict:
+    """Прогон расчета по корзинам: пропускная способность, p50/p99 задержки и количество запросов.
+    Исходы расчета сохраняются в виде, пригодном для сравнения с эталоном"""
+    latencies, outcomes, queries = [], [], 0
+    for cart in carts:
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            outcome = price(cart)
+            latencies.append(time.perf_counter() - started)
+        queries += len(captured)
+        outcomes.append(normalize(outcome))
+    elapsed = sum(latencies)
+    latencies.sort()
+    return {
+        "carts": len(carts),
+        "carts_per_sec": len(carts) / elapsed if elapsed else 0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "queries": queries,
+        "outcomes": outcomes,
+    }
+
+
+def normalize(pricing: dict) -> tuple:
+    """Результат расчета с суммами, приведенными к Decimal с точностью до копеек"""
+    return (
+        Decimal(pricing["total_price"]).quantize(CENTS),
+        sorted((product_id, Decimal(price).quantize(CENTS)) for product_id, price in pricing["products"].items()),
+    )
+
+
+def percentile(values: list, percent: int) -> float:
+    """Перцентиль отсортированного списка"""
+    if not values:
+        return 0
+    return values[min(len(values) - 1, len(values) * percent // 100)]
+
+
+def simulate(
+    categories: int = 20,
+    products: int = 2000,
+    shop_discounts: int = 200,
+    cart_discounts: int = 200,
+    carts: int = 5000,
+    max_lines: int = 10,
+    check: int = 500,
+    seed_value: int = 1,
+) -> dict:
+    """
+    Прогон движка скидок на синтетических данных. Данные создаются в транзакции и откатываются.
+    Движок считается без кэша, затем повторно через прогретый кэш расчетов,
+    первые check корзин сверяются с эталоном.
+    Возвращает статистику прогонов и количество расхождений с эталоном
+    """
+    rng = random.Random(seed_value)
+    try:
+        with transaction.atomic():
+            catalog = seed(rng, categories, products, shop_discounts, cart_discounts)
+            simulated = generate_carts(rng, catalog, carts, max_lines)
+            report = {
+                "engine": measure(simulated, lambda cart: DiscountService(cart).calculate()),
+                "cached": [measure(simulated, lambda cart: DiscountService(cart).pricing) for _ in range(2)][-1],
+                "reference": measure(simulated[:check], reference_pricing),
+            }
+            transaction.set_rollback(True)
+    finally:
+        reset_rules_version()
+    report["mismatches"] = sum(
+        engine != reference for engine, reference in zip(report["engine"]["outcomes"], report["reference"]["outcomes"])
+    )
+    return report
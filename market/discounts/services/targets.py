@@ -0,0 +1,46 @@
+from discounts.models import CartItemDiscount, DiscountKind, DiscountTarget, ShopItemDiscount
+
+DISCOUNT_KINDS = {ShopItemDiscount: DiscountKind.shop, CartItemDiscount: DiscountKind.cart}
+TARGET_FIELDS = ("active", "start_date", "end_date", "discount_amount", "discount_amount_type")
+CART_TARGET_FIELDS = ("total_price_of_cart", "amount_product_in_cart")
+
+
+def build_targets(discount, kind: int) -> list:
+    """Строки целей скидки: по одной на каждый продукт и категорию или одна без них"""
+    fields = {field: getattr(discount, field) for field in TARGET_FIELDS}
+    if kind == DiscountKind.cart:
+        fields.update({field: getattr(discount, field) for field in CART_TARGET_FIELDS})
+    targets = [{"product_id": product.id} for product in discount.products.all()]
+    targets += [{"category_id": category.id} for category in discount.categories.all()]
+    return [
+        DiscountTarget(discount_type=kind, discount_id=discount.id, **fields, **target) for target in targets or [{}]
+    ]
+
+
+def sync_discount_targets(model, discount_ids) -> None:
+    """Пересоздает строки целей скидок модели по их текущему состоянию. Удаленные скидки теряют строки"""
+    kind = DISCOUNT_KINDS[model]
+    discount_ids = set(discount_ids)
+    if not discount_ids:
+        return
+    discounts = model.objects.filter(id__in=discount_ids).prefetch_related("products", "categories")
+    DiscountTarget.objects.filter(discount_type=kind, discount_id__in=discount_ids).delete()
+    DiscountTarget.objects.bulk_create(target for discount in discounts for target in build_targets(discount, kind))
+
+
+def set_targets_active(model, discount_ids, active: bool) -> int:
+    """Перенос включения или выключения скидок в их строки целей одним UPDATE"""
+    return DiscountTarget.objects.filter(discount_type=DISCOUNT_KINDS[model], discount_id__in=discount_ids).update(
+        active=active
+    )
+
+
+def rebuild_discount_targets() -> int:
+    """Полное пересоздание строк целей всех скидок, возвращает количество строк"""
+    DiscountTarget.objects.all().delete()
+    for model, kind in DISCOUNT_KINDS.items():
+        discounts = model.objects.prefetch_related("products", "categories")
+        DiscountTarget.objects.bulk_create(
+            target for discount in discounts.iterator(chunk_size=500) for target in build_targets(discount, kind)
+        )
+    return DiscountTarget.objects.count()
@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from discounts.models import CartItemDiscount, ShopItemDiscount
+from discounts.services.price_materializer import discount_targets, schedule_refresh, schedule_summary_refresh
+from discounts.services.rule_table import bump_rules_version
+from discounts.services.scheduler import schedule_next_boundary
+from discounts.services.targets import sync_discount_targets
+from products.models import Product
+from shops.models import Offer
+
+
+@receiver(post_save, sender=ShopItemDiscount)
+def discount_saved(sender, instance, raw=False, **kwargs):
+    """Пересчет цен предложений, на которые распространяется скидка"""
+    if not raw:
+        product_ids, category_ids = discount_targets(instance)
+        schedule_refresh(product_ids=product_ids, category_ids=category_ids)
+
+
+@receiver(pre_delete, sender=ShopItemDiscount)
+def discount_deleted(sender, instance, **kwargs):
+    """Пересчет цен предложений после удаления скидки"""
+    product_ids, category_ids = discount_targets(instance)
+    schedule_refresh(product_ids=product_ids, category_ids=category_ids)
+
+
+@receiver(m2m_changed, sender=ShopItemDiscount.products.through)
+def discount_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчет цен при изменении списка продуктов скидки"""
+    _targets_changed(instance, action, reverse, pk_set, field="products")
+
+
+@receiver(m2m_changed, sender=ShopItemDiscount.categories.through)
+def discount_categories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Пересчет цен при изменении списка категорий скидки"""
+    _targets_changed(instance, action, reverse, pk_set, field="categories")
+
+
+def _targets_changed(instance, action, reverse, pk_set, field):
+    """Определяет затронутые продукты или категории и планирует пересчет.
+    При очистке связей id запоминаются до удаления, так как после него их уже не получить"""
+    if action == "pre_clear":
+        if reverse:
+            instance._cleared_target_ids = {instance.pk}
+        else:
+            instance._cleared_target_ids = set(getattr(instance, field).values_list("id", flat=True))
+        return
+    if action == "post_clear":
+        target_ids = instance.__dict__.pop("_cleared_target_ids", set())
+    elif action in ("post_add", "post_remove"):
+        target_ids = {instance.pk} if reverse else pk_set
+    else:
+        return
+    if field == "products":
+        schedule_refresh(product_ids=target_ids)
+    else:
+        schedule_refresh(category_ids=target_ids)
+
+
+@receiver(post_save, sender=ShopItemDiscount)
+@receiver(post_save, sender=CartItemDiscount)
+@receiver(post_delete, sender=ShopItemDiscount)
+@receiver(post_delete, sender=CartItemDiscount)
+@receiver(m2m_changed, sender=ShopItemDiscount.products.through)
+@receiver(m2m_changed, sender=ShopItemDiscount.categories.through)
+@receiver(m2m_changed, sender=CartItemDiscount.products.through)
+@receiver(m2m_changed, sender=CartItemDiscount.categories.through)
+def discount_rules_changed(sender, **kwargs):
+    """Пересборка таблицы правил скидок в процессах после изменения скидки или ее связей"""
+    if kwargs.get("action", "post_").startswith("post_"):
+        bump_rules_version()
+
+
+@receiver(post_save, sender=ShopItemDiscount)
+@receiver(post_save, sender=CartItemDiscount)
+def discount_dates_saved(sender, instance, raw=False, **kwargs):
+    """Постановка задачи расписания, если даты скидки дают более раннюю границу"""
+    if not raw:
+        transaction.on_commit(schedule_next_boundary)
+
+
+@receiver(post_save, sender=ShopItemDiscount)
+@receiver(post_save, sender=CartItemDiscount)
+@receiver(post_delete, sender=ShopItemDiscount)
+@receiver(post_delete, sender=CartItemDiscount)
+def discount_targets_saved(sender, instance, **kwargs):
+    """Обновление строк целей скидки вместе с ней самой. При загрузке фикстур строка без связей
+    создается сразу, а продукты и категории добавятся следующими сигналами m2m_changed"""
+    sync_discount_targets(sender, {instance.pk})
+
+
+@receiver(m2m_changed, sender=ShopItemDiscount.products.through)
+@receiver(m2m_changed, sender=ShopItemDiscount.categories.through)
+@receiver(m2m_changed, sender=CartItemDiscount.products.through)
+@receiver(m2m_changed, sender=CartItemDiscount.categories.through)
+def discount_targets_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Обновление строк целей скидок при изменении их продуктов и категорий с любой стороны связи"""
+    discount_model = model if reverse else type(instance)
+    if action == "pre_clear" and reverse:
+        accessor = discount_model._meta.model_name
+        instance._cleared_discount_ids = set(getattr(instance, accessor).values_list("id", flat=True))
+    elif action == "post_clear" and reverse:
+        sync_discount_targets(discount_model, instance.__dict__.pop("_cleared_discount_ids", set()))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        sync_discount_targets(discount_model, pk_set if reverse else {instance.pk})
+
+
+@receiver(post_save, sender=Offer)
+def offer_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Расчет цены со скидкой для нового или измененного предложения"""
+    if not raw and update_fields != frozenset(["discount_price"]):
+        schedule_refresh(offer_ids={instance.pk})
+
+
+@receiver(post_delete, sender=Offer)
+def offer_deleted(sender, instance, **kwargs):
+    """Пересчет сводных цен продукта удаленного предложения"""
+    schedule_summary_refresh({instance.product_id})
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, raw=False, **kwargs):
+    """Пересчет цен предложений продукта, так как могла измениться его категория"""
+    if not (raw or created):
+        schedule_refresh(product_ids={instance.pk})
@@ -1,19 +1,16 @@
-from discounts.models import ShopItemDiscount, CartItemDiscount
+from discounts.services.scheduler import apply_discount_schedule, schedule_next_boundary
 from config.celery import app
 
 
-@app.task(name="check_discounts_last_time", bind=True)
-def check_discounts_last_time():
-    """Function to check last time of discounts"""
-    shop_discounts = ShopItemDiscount.objects.filter(active=True).all()
-    cart_discounts = CartItemDiscount.objects.filter(active=True).all()
+@app.task(name="apply_discount_schedule")
+def run_discount_schedule():
+    """Включение и выключение скидок по датам начала и окончания и постановка следующей границы"""
+    totals = apply_discount_schedule()
+    schedule_next_boundary()
+    return totals
 
-    deactivated = [
-        discount.last_discount_time
-        for discounts in (shop_discounts, cart_discounts)
-        for discount in discounts
-        if discount is not None
-    ]
 
-    if deactivated:
-        print("Discounts deactivated:", deactivated)
+@app.task(name="check_discounts_last_time")
+def check_discounts_last_time():
+    """Периодическая проверка расписания скидок на случай пропущенной границы"""
+    return run_discount_schedule()
@@ -1,14 +1,25 @@
-from django.test import TestCase
-from unittest.mock import MagicMock
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.signed_cookies import SessionStore
+from django.test import RequestFactory, TestCase
+from unittest.mock import MagicMock, patch
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
-from discounts.models import ShopItemDiscount, CartItemDiscount
+from discounts.models import ShopItemDiscount, CartItemDiscount, DiscountKind, DiscountTarget
 from discounts.forms import ShopDiscountCreationForm, CartDiscountCreationForm
-from discounts.services.discountservice import DiscountService
+from discounts.services.discountservice import DiscountService, percent_discount
+from discounts.services.rule_table import get_rule_table, rules_version
+from discounts.services.scheduler import apply_discount_schedule, next_boundary
+from discounts.services.simulator import simulate
+from discounts.services.targets import rebuild_discount_targets
+from discounts.tasks import run_discount_schedule
 from products.models import Product
 from catalog.models import Catalog
 from cart.cart import Cart
+from shops.models import Offer
 
 
 class DiscountCreateModel(TestCase):
@@ -57,7 +68,7 @@ class DiscountCreateModel(TestCase):
             "discount_amount_type": 1,
             "start_date": self.date_now,
             "end_date": self.nex_date,
-            "active": True,
+            "enabled": True,
         }
 
         categories = [self.categories.first()]
@@ -83,7 +94,7 @@ class DiscountCreateModel(TestCase):
             "discount_amount_type": 1,
             "start_date": self.date_now,
             "end_date": self.nex_date,
-            "active": True,
+            "enabled": True,
             "total_price_of_cart": 500,
             "amount_product_in_cart": 2,
         }
@@ -110,7 +121,7 @@ class DiscountCreateModel(TestCase):
             "discount_amount_type": 1,
             "start_date": self.nex_date,
             "end_date": self.date_now,
-            "active": True,
+            "enabled": True,
         }
 
         form = ShopDiscountCreationForm(incorrect_form_data)
@@ -131,7 +142,7 @@ class DiscountCreateModel(TestCase):
             "discount_amount_type": 1,
             "start_date": self.nex_date,
             "end_date": self.date_now,
-            "active": True,
+            "enabled": True,
         }
 
         form = self.cart_discount_form(incorrect_form_data)
@@ -149,7 +160,7 @@ class DiscountCreateModel(TestCase):
             "discount_amount_type": 1,
             "start_date": self.date_now,
             "end_date": self.nex_date,
-            "active": True,
+            "enabled": True,
             "categories": [self.categories.first()],
             "total_price_of_cart": 100,
             "amount_product_in_cart": 5,
@@ -165,6 +176,7 @@ class DiscountCreateModel(TestCase):
     def test_discount_service(self):
         """Проверка работы сервиса обработки скидок"""
 
+        cache.clear()
         request_mock = MagicMock()
         cart_mock = MagicMock(spec=Cart, request=request_mock)
 
@@ -197,3 +209,325 @@ class DiscountCreateModel(TestCase):
         total_cart_price = discounts.get_total_price_with_discount
         self.assertEqual(products_with_discount, {product1: 1, product2: 1})
         self.assertEqual(total_cart_price, 2)
+
+
+class DiscountRuleTableTest(TestCase):
+    """Тестирование таблицы правил скидок"""
+
+    fixtures = [
+        "fixtures/010_auth_group.json",
+        "fixtures/011_users.json",
+        "fixtures/020_catalog_categories.json",
+        "fixtures/025_products.json",
+        "fixtures/075_discounts_shop_item_discount.json",
+        "fixtures/080_discounts_cart_item_discount.json",
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, rules) -> set:
+        return {rule.id for rule in rules}
+
+    def test_rules_match_queries(self):
+        """Правила таблицы совпадают с выборками скидок из бд"""
+        table = get_rule_table()
+        categories = Catalog.objects.all()
+        for product in Product.objects.all():
+            self.assertEqual(
+                self.ids(table.shop_by_product.get(product.id, [])),
+                set(product.shopitemdiscount.filter(active=True).values_list("id", flat=True)),
+            )
+            self.assertEqual(
+                {rule.id for rule in table.cart_by_product.get(product.id, []) if rule.category_ids},
+                set(
+                    product.cartitemdiscount.filter(active=True, categories__in=categories).values_list(
+                        "id", flat=True
+                    )
+                ),
+            )
+        for category in categories:
+            self.assertEqual(
+                self.ids(table.shop_by_category.get(category.id, [])),
+                set(category.shopitemdiscount.filter(active=True).values_list("id", flat=True)),
+            )
+        self.assertEqual(
+            self.ids(table.cart_wide),
+            set(
+                CartItemDiscount.objects.filter(active=True, products=None, categories=None).values_list(
+                    "id", flat=True
+                )
+            ),
+        )
+
+    def test_no_queries(self):
+        """Расчет скидок корзины по собранной таблице не обращается к бд"""
+        products = list(Product.objects.select_related("category")[:3])
+        cart_mock = MagicMock(spec=Cart)
+        cart_mock.get_products.return_value = {product: {"pcs": 2, "unit_price": 300} for product in products}
+        cart_mock.get_total_price.return_value = 1800
+        cart_mock.get_products_quantity.return_value = 6
+        get_rule_table()
+        with self.assertNumQueries(0):
+            DiscountService(cart_mock).get_total_price_with_discount
+
+    def test_rebuilt_on_change(self):
+        """Изменение скидки меняет версию, и таблица собирается заново"""
+        table = get_rule_table()
+        self.assertIs(get_rule_table(), table)
+        discount = ShopItemDiscount.objects.filter(active=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            discount.products.add(Product.objects.get(id=7))
+        self.assertIsNot(get_rule_table(), table)
+        self.assertIn(discount.id, self.ids(get_rule_table().shop_by_product[7]))
+
+
+class DiscountPricingCacheTest(TestCase):
+    """Тестирование кэша расчета скидок корзины"""
+
+    fixtures = DiscountRuleTableTest.fixtures
+
+    def setUp(self):
+        cache.clear()
+
+    def get_cart(self, unit_price):
+        cart_mock = MagicMock(spec=Cart)
+        cart_mock.get_products.return_value = {
+            Product.objects.get(id=1): {"pcs": 1, "unit_price": unit_price},
+            Product.objects.get(id=2): {"pcs": 1, "unit_price": unit_price},
+        }
+        cart_mock.get_total_price.return_value = unit_price * 2
+        cart_mock.get_products_quantity.return_value = 2
+        return cart_mock
+
+    def test_identical_carts_reuse_pricing(self):
+        """Одинаковые корзины считаются один раз, другая цена дает новый расчет"""
+        with patch.object(DiscountService, "_get_max_discount", autospec=True, return_value=100) as calculation:
+            self.assertEqual(DiscountService(self.get_cart(200)).get_total_price_with_discount, 100)
+            self.assertEqual(DiscountService(self.get_cart(200)).get_total_price_with_discount, 100)
+            self.assertEqual(calculation.call_count, 1)
+            DiscountService(self.get_cart(300)).get_total_price_with_discount
+            self.assertEqual(calculation.call_count, 2)
+
+    def test_cached_breakdown(self):
+        """Из кэша возвращаются те же цены продуктов, что и при расчете"""
+        calculated = DiscountService(self.get_cart(200))
+        expected = (calculated.get_total_price_with_discount, calculated.get_product_with_new_price)
+        cached = DiscountService(self.get_cart(200))
+        with self.assertNumQueries(0):
+            self.assertEqual((cached.get_total_price_with_discount, cached.get_product_with_new_price), expected)
+        self.assertEqual(list(expected[1]), [Product.objects.get(id=1), Product.objects.get(id=2)])
+
+    def test_discount_change_invalidates(self):
+        """Изменение скидки меняет версию правил, и корзина считается заново"""
+        self.assertEqual(DiscountService(self.get_cart(200)).get_total_price_with_discount, 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            ShopItemDiscount.objects.all().delete()
+            CartItemDiscount.objects.all().delete()
+        self.assertEqual(DiscountService(self.get_cart(200)).get_total_price_with_discount, 400)
+
+
+class DiscountPriceMaterializerTest(TestCase):
+    """Класс тестов пересчета цен со скидкой"""
+
+    fixtures = [
+        "fixtures/010_auth_group.json",
+        "fixtures/011_users.json",
+        "fixtures/020_catalog_categories.json",
+        "fixtures/025_products.json",
+        "fixtures/040_shops.json",
+        "fixtures/045_offers.json",
+    ]
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch.object(run_discount_schedule, "apply_async")
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.date_now = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount = ShopItemDiscount.objects.create(
+                name="test_discount",
+                description="some description",
+                discount_amount=10,
+                discount_amount_type=1,
+                active=True,
+                start_date=self.date_now,
+                end_date=self.date_now + timezone.timedelta(days=1),
+            )
+
+    def test_products_changed(self):
+        """Цена пересчитывается только для предложений продуктов, добавленных в скидку"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.products.add(Product.objects.get(id=1))
+        self.assertEqual(Offer.objects.get(id=1).discount_price, Decimal("4500.00"))
+        self.assertEqual(Offer.objects.get(id=2).discount_price, Decimal("0.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.products.clear()
+        self.assertEqual(Offer.objects.get(id=1).discount_price, Decimal("5000.00"))
+
+    def test_offer_price_changed(self):
+        """Цена со скидкой пересчитывается при изменении цены предложения"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.categories.add(Catalog.objects.get(id=1))
+            offer = Offer.objects.get(id=2)
+            offer.price = 1000
+            offer.save()
+        self.assertEqual(Offer.objects.get(id=2).discount_price, Decimal("900.00"))
+        self.apply_async.assert_called_once_with(eta=self.discount.end_date)
+
+    def test_cart_discount_applied_once(self):
+        """Скидка магазина, уже учтенная в цене предложения, не применяется в корзине повторно"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.discount.products.add(Product.objects.get(id=1))
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        request.session["cart"] = {"1": {"quantity": 2, "created_at": int(self.date_now.timestamp())}}
+        cart = Cart(request)
+        self.assertEqual(cart.get_total_price(), Decimal("9000.00"))
+        self.assertEqual(DiscountService(cart).get_total_price_with_discount, Decimal("9000.00"))
+
+    def test_rebuild_command(self):
+        """Команда полного пересчета цен со скидкой"""
+        call_command("rebuild_discount_prices", stdout=MagicMock())
+        self.assertFalse(Offer.objects.filter(discount_price=0).exists())
+
+
+class DiscountScheduleTest(TestCase):
+    """Класс тестов расписания скидок"""
+
+    fixtures = DiscountPriceMaterializerTest.fixtures
+
+    def setUp(self):
+        cache.clear()
+        patcher = patch.object(run_discount_schedule, "apply_async")
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = timezone.now()
+        self.running, self.upcoming = (
+            ShopItemDiscount.objects.create(
+                name=name,
+                description="some description",
+                discount_amount=10,
+                discount_amount_type=1,
+                active=True,
+                start_date=self.now + timezone.timedelta(days=start),
+                end_date=self.now + timezone.timedelta(days=start + 1),
+            )
+            for name, start in (("running", 0), ("upcoming", 2))
+        )
+        self.upcoming.products.add(Product.objects.get(id=1))
+        apply_discount_schedule(self.now)
+
+    def test_dates_honoured(self):
+        """Скидка с будущей датой начала сохраняется выключенной и включается в дату начала"""
+        self.assertTrue(ShopItemDiscount.objects.get(pk=self.running.pk).active)
+        self.assertFalse(ShopItemDiscount.objects.get(pk=self.upcoming.pk).active)
+        self.assertEqual(next_boundary(self.now), self.running.end_date)
+
+        version = rules_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = apply_discount_schedule(self.upcoming.start_date)
+        self.assertEqual(totals, {"activated": 1, "expired": 1})
+        self.assertEqual(
+            set(ShopItemDiscount.objects.filter(active=True).values_list("name", flat=True)), {"upcoming"}
+        )
+        self.assertNotEqual(rules_version(), version)
+        self.assertEqual(Offer.objects.get(id=1).discount_price, Decimal("4500.00"))
+        self.assertEqual(next_boundary(self.upcoming.start_date), self.upcoming.end_date)
+
+    def test_disabled_not_activated(self):
+        """Выключенная вручную скидка не активируется ни в период действия, ни в дату начала"""
+        self.running.enabled = False
+        self.running.save()
+        self.upcoming.enabled = False
+        self.upcoming.save()
+        self.assertFalse(ShopItemDiscount.objects.get(pk=self.running.pk).active)
+        cache.clear()
+        self.assertEqual(apply_discount_schedule(self.now), {"activated": 0, "expired": 0})
+        self.assertEqual(apply_discount_schedule(self.upcoming.start_date), {"activated": 0, "expired": 0})
+        self.assertIsNone(next_boundary(self.now))
+        self.assertFalse(ShopItemDiscount.objects.get(pk=self.upcoming.pk).enabled)
+
+    def test_read_does_not_write(self):
+        """Время до окончания скидки считается без записи в бд"""
+        ShopItemDiscount.objects.filter(pk=self.running.pk).update(end_date=self.now - timezone.timedelta(seconds=1))
+        discount = ShopItemDiscount.objects.get(pk=self.running.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(discount.last_discount_time, timezone.timedelta(seconds=0))
+        self.assertTrue(ShopItemDiscount.objects.get(pk=self.running.pk).active)
+
+
+class DiscountTargetTest(TestCase):
+    """Класс тестов денормализованных целей скидок"""
+
+    fixtures = DiscountRuleTableTest.fixtures
+
+    def targets(self, discount) -> set:
+        return set(
+            DiscountTarget.objects.filter(discount_type=DiscountKind.cart, discount_id=discount.id).values_list(
+                "product_id", "category_id", "active", "amount_product_in_cart"
+            )
+        )
+
+    def test_rebuild_matches_signals(self):
+        """Строки, созданные сигналами при загрузке фикстур, совпадают с полным пересозданием"""
+        fields = ("discount_type", "discount_id", "product_id", "category_id", "active", "discount_amount")
+        synced = list(DiscountTarget.objects.order_by(*fields).values_list(*fields))
+        rebuild_discount_targets()
+        self.assertEqual(list(DiscountTarget.objects.order_by(*fields).values_list(*fields)), synced)
+
+    def test_follows_changes(self):
+        """Строки следуют за изменениями связей с обеих сторон, условий и удалением скидки"""
+        discount = CartItemDiscount.objects.create(
+            name="targets",
+            description="some description",
+            discount_amount=10,
+            discount_amount_type=1,
+            active=True,
+            start_date=timezone.now(),
+            end_date=timezone.now() + timezone.timedelta(days=1),
+            amount_product_in_cart=2,
+        )
+        self.assertEqual(self.targets(discount), {(None, None, True, 2)})
+        discount.products.add(1)
+        Product.objects.get(id=2).cartitemdiscount.add(discount)
+        discount.categories.add(1)
+        self.assertEqual(self.targets(discount), {(1, None, True, 2), (2, None, True, 2), (None, 1, True, 2)})
+        Product.objects.get(id=1).cartitemdiscount.clear()
+        discount.categories.clear()
+        discount.amount_product_in_cart = 3
+        discount.save()
+        self.assertEqual(self.targets(discount), {(2, None, True, 3)})
+        apply_discount_schedule(discount.end_date)
+        self.assertEqual(self.targets(discount), {(2, None, False, 3)})
+        discount.delete()
+        self.assertEqual(self.targets(discount), set())
+
+
+class DiscountSimulatorTest(TestCase):
+    """Класс тестов симулятора скидок"""
+
+    def test_engine_matches_reference(self):
+        """Движок совпадает с эталонным расчетом и не обращается к бд после сборки таблицы правил"""
+        report = simulate(categories=3, products=30, shop_discounts=15, cart_discounts=15, carts=100, check=100)
+        self.assertEqual(report["mismatches"], 0)
+        self.assertLessEqual(report["engine"]["queries"], 1)
+        self.assertEqual(report["cached"]["queries"], 0)
+        self.assertGreater(report["reference"]["queries"], 100)
+        self.assertFalse(ShopItemDiscount.objects.exists())
+
+    def test_percent_discount_in_decimal(self):
+        """Процентная скидка считается в Decimal и складывается с фиксированными скидками"""
+        self.assertEqual(percent_discount(Decimal("999.99"), Decimal("15")), Decimal("150.00"))
+        self.assertEqual(percent_discount(1000, Decimal("12.5")) + Decimal("10.00"), Decimal("135.00"))
+
+    def test_command(self):
+        """Команда выводит статистику прогонов"""
+        stdout = MagicMock()
+        call_command("simulate_discounts", products=10, carts=10, check=10, stdout=stdout)
+        output = "".join(call.args[0] for call in stdout.write.call_args_list)
+        self.assertIn("корзин/с", output)
+        self.assertIn("Расхождений с эталоном: 0", output)
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:20
+
+from django.db import migrations
+
+CREATE_INDEX = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS products_product_name_trgm "
+    "ON products_product USING gin (UPPER(name::text) gin_trgm_ops)",
+)
+DROP_INDEX = ("DROP INDEX IF EXISTS products_product_name_trgm",)
+
+
+def run_on_postgresql(statements):
+    """Триграммный индекс для поиска по наименованию (name__icontains) доступен только на PostgreSQL"""
+
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(CREATE_INDEX), run_on_postgresql(DROP_INDEX)),
+    ]
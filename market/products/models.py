@@ -1,9 +1,9 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
-from catalog.cache_for_catalog import clear_cache_catalog
+from catalog.cache_for_catalog import bump_generations, clear_cache_catalog
 from users.models import CustomUser as User
-from django.db.models import Avg, ManyToManyField
+from django.db.models import Avg, ManyToManyField, Q
 from taggit.managers import TaggableManager
 
 
@@ -53,12 +53,20 @@ class Product(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        """Очистка кэша при добавлении или изменении продукта"""
+        """Очистка кэша при добавлении или изменении продукта.
+        Сбрасываются поколения кэша результатов старой и новой категории продукта"""
         clear_cache_catalog()
+        categories = self._meta.get_field("category").related_model.objects.filter(
+            Q(pk=self.category_id) | Q(category=self.pk) if self.pk else Q(pk=self.category_id)
+        )
+        slugs = list(categories.values_list("slug", flat=True))
         super().save(*args, **kwargs)
+        bump_generations(slugs)
 
     def get_count_reviews(self) -> int:
-        """Вывод количества отзывов о продукте"""
+        """Вывод количества отзывов о продукте. Если количество уже аннотировано в запросе, запрос не выполняется"""
+        if hasattr(self, "reviews_count"):
+            return self.reviews_count
         return Review.objects.filter(product=self).count()
 
     def get_average_rating(self) -> float:
@@ -66,7 +74,9 @@ class Product(models.Model):
         return Review.objects.filter(product=self).aggregate(Avg("rating")).get("rating__avg") or 0
 
     def get_count_history(self) -> int:
-        """Подсчет просмотров истории продукта"""
+        """Подсчет просмотров истории продукта. Если количество уже аннотировано в запросе, запрос не выполняется"""
+        if hasattr(self, "views_count"):
+            return self.views_count
         return Browsing_history.objects.filter(product=self).count()
 
 
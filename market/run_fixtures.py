@@ -13,3 +13,5 @@ django.setup()
 files = os.listdir("fixtures")
 for i in files:
     call_command("loaddata", "fixtures/" + i)
+call_command("rebuild_discount_prices")
+call_command("rebuild_search_index")
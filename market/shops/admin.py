@@ -3,13 +3,14 @@ from django.contrib import admin  # noqa F401
 from django.core.exceptions import ValidationError
 from django.forms.models import BaseInlineFormSet
 
-from catalog.cache_for_catalog import clear_cache_catalog
+from catalog.cache_for_catalog import bump_generations, clear_cache_catalog
+from catalog.models import Catalog
 from .models import Shop, Offer, Banner, Order, OrderStatus, OrderStatusChange
 
 
 class ShopProductForm(BaseInlineFormSet):
     """Валидация на добавление более 2-х продуктов с одиноковым id.
-    После валидности, кэш Catalog очищается"""
+    После валидности, кэш Catalog очищается и сбрасываются поколения категорий продуктов"""
 
     def clean(self):
         super(ShopProductForm, self).clean()
@@ -23,12 +24,13 @@ class ShopProductForm(BaseInlineFormSet):
                 raise ValidationError(f"Ошибка. Продукт{product[-1:]} не может повторяться")
             else:
                 clear_cache_catalog()
+        bump_generations(Catalog.objects.filter(category__in=product).values_list("slug", flat=True))
 
 
 class ShopProductInline(admin.TabularInline):
     model = Shop.products.through
     formset = ShopProductForm
-    exclude = ("discount_price",)
+    exclude = ("discount_price", "price_version")
 
 
 @admin.register(Shop)
@@ -51,7 +53,7 @@ class OfferAdmin(admin.ModelAdmin):
         "product",
         "price",
     )
-    exclude = ("discount_price",)
+    exclude = ("discount_price", "price_version")
 
 
 @admin.register(Banner)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("shops", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offer",
+            name="price_version",
+            field=models.PositiveIntegerField(default=1, verbose_name="версия цены"),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.1 on 2026-10-18 19:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("shops", "0002_offer_price_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="offer",
+            name="stock",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="пусто - количество не ограничено", null=True, verbose_name="остаток"
+            ),
+        ),
+        migrations.CreateModel(
+            name="StockReservation",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("quantity", models.PositiveIntegerField(verbose_name="количество")),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="действует до")),
+                (
+                    "offer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="reservations", to="shops.offer"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "резерв товара",
+                "verbose_name_plural": "резервы товаров",
+                "unique_together": {("offer", "user")},
+            },
+        ),
+    ]
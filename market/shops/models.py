@@ -31,7 +31,11 @@ class Offer(models.Model):
     product = models.ForeignKey("products.Product", on_delete=models.PROTECT, related_name="offers")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name=_("цена"))
     discount_price = models.DecimalField(max_digits=10, default=0, decimal_places=2, verbose_name=_("цена со скидкой"))
+    price_version = models.PositiveIntegerField(default=1, verbose_name=_("версия цены"))
     product_in_stock = models.BooleanField(default=True, verbose_name=_("товар в наличии"))
+    stock = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name=_("остаток"), help_text=_("пусто - количество не ограничено")
+    )
     free_shipping = models.BooleanField(default=False, verbose_name=_("бесплатная доставка"))
     date_of_creation = models.DateTimeField(auto_now_add=True)
 
@@ -40,7 +44,9 @@ class Offer(models.Model):
 
     @property
     def product_discount(self):
-        """Вывод скидки на продукт"""
+        """Вывод скидки на продукт. Если скидка уже получена через BulkOfferDiscount, запросы не выполняются"""
+        if hasattr(self, "_product_discount"):
+            return self._product_discount
         discount = OfferDiscount(self)
         return discount()
 
@@ -53,6 +59,20 @@ class Offer(models.Model):
         return price
 
 
+class StockReservation(models.Model):
+    """Резерв остатка предложения на время оформления заказа"""
+
+    class Meta:
+        verbose_name = _("резерв товара")
+        verbose_name_plural = _("резервы товаров")
+        unique_together = (("offer", "user"),)
+
+    offer = models.ForeignKey(Offer, on_delete=models.CASCADE, related_name="reservations")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="reservations")
+    quantity = models.PositiveIntegerField(verbose_name=_("количество"))
+    expires_at = models.DateTimeField(db_index=True, verbose_name=_("действует до"))
+
+
 class Banner(models.Model):
     """Модель баннеров"""
 
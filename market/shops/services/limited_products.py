@@ -6,6 +6,7 @@ from django.core.cache import cache
 from django.core.cache.utils import make_template_fragment_key
 from products.models import Product, Browsing_history
 from site_settings.models import SiteSettings
+from shops.services.offer_discount import prefetch_offer_discounts
 from ..tasks import update_product_of_the_day
 
 
@@ -25,7 +26,7 @@ def get_top_products():
                            items()), key=lambda key: key[1])[:-site_settings.hot_deals_slider-1:-1]
     products = [value for value, key in products]
     if products:
-        return products
+        return prefetch_offer_discounts(products)
     return None
 
 
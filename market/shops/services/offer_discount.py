@@ -1,3 +1,16 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Q, prefetch_related_objects
+
+from discounts.models import DiscountKind, DiscountTarget
+
+
+def discount_value(price, discount_amount, discount_amount_type) -> Decimal:
+    """Размер скидки в деньгах для цены"""
+    return discount_amount if discount_amount_type == 2 else price / 100 * discount_amount
+
+
 class OfferDiscount:
     """Класс для получения скидки для продукта в офере"""
 
@@ -15,9 +28,7 @@ class OfferDiscount:
         """Метод для получения максимальной скидки"""
         discount = max(
             [
-                discount.discount_amount
-                if discount.discount_amount_type == 2
-                else self.price / 100 * discount.discount_amount
+                discount_value(self.price, discount.discount_amount, discount.discount_amount_type)
                 for discount in discounts.filter(active=True, **kwargs)
             ],
             default=0,
@@ -26,9 +37,66 @@ class OfferDiscount:
 
     def get_all_discounts(self):
         """Метод для получения максимальной скидки из всех возможных"""
-        product_discount = self.product.shopitemdiscount
-        product_category_discount = self.product_category.shopitemdiscount
-        max_discount = max(
-            self.get_product_discount(product_discount), self.get_product_discount(product_category_discount)
+        product_discount = self.get_product_discount(self.product.shopitemdiscount)
+        if self.product_category is None:
+            return product_discount
+        category_discount = self.get_product_discount(self.product_category.shopitemdiscount)
+        return max(product_discount, category_discount)
+
+
+class BulkOfferDiscount:
+    """Класс для получения скидок сразу для набора оферов.
+    Количество запросов не зависит от количества оферов: активные скидки на продукты и категории оферов
+    загружаются одним запросом к денормализованным целям скидок и раскладываются по словарям"""
+
+    def __init__(self, offers):
+        if hasattr(offers, "select_related"):
+            offers = offers.select_related("product")
+        self.offers = list(offers)
+        self.discounts = {}
+        self.product_discounts = defaultdict(list)
+        self.category_discounts = defaultdict(list)
+        self._load_discounts()
+
+    def __call__(self, *args, **kwargs) -> dict:
+        """Возвращает словарь {id офера: скидка} и запоминает скидку в каждом офере"""
+        discounts = {}
+        for offer in self.offers:
+            offer._product_discount = discounts[offer.id] = self.get_offer_discount(offer)
+        return discounts
+
+    def _load_discounts(self):
+        """Загрузка активных скидок на продукты и категории оферов одним запросом к целям скидок"""
+        if not self.offers:
+            return
+        product_ids = {offer.product_id for offer in self.offers}
+        category_ids = {offer.product.category_id for offer in self.offers} - {None}
+        targets = DiscountTarget.objects.filter(
+            Q(product_id__in=product_ids) | Q(category_id__in=category_ids),
+            discount_type=DiscountKind.shop,
+            active=True,
+        ).values_list("discount_id", "product_id", "category_id", "discount_amount", "discount_amount_type")
+        for discount_id, product_id, category_id, amount, amount_type in targets:
+            self.discounts[discount_id] = (amount, amount_type)
+            if product_id is not None:
+                self.product_discounts[product_id].append(discount_id)
+            else:
+                self.category_discounts[category_id].append(discount_id)
+
+    def get_offer_discount(self, offer):
+        """Максимальная скидка офера среди скидок на продукт и на его категорию"""
+        discount_ids = self.product_discounts.get(offer.product_id, []) + self.category_discounts.get(
+            offer.product.category_id, []
         )
-        return max_discount
+        return max(
+            [discount_value(offer.price, *self.discounts[discount_id]) for discount_id in discount_ids],
+            default=0,
+        )
+
+
+def prefetch_offer_discounts(products) -> list:
+    """Подгружает оферы продуктов и скидки для них. Возвращает список продуктов"""
+    products = list(products)
+    prefetch_related_objects(products, "offers")
+    BulkOfferDiscount([offer for product in products for offer in product.offers.all()])()
+    return products
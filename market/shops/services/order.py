@@ -2,20 +2,26 @@ from decimal import Decimal
 from typing import Any
 
 from django.conf import settings
-from django.db.models import F, Sum
+from django.db.models import F
 from django.db import transaction
 
+from cart.cart import revalidate_cart
 from cart.models import CartItem, Cart
 from shops.models import OrderOffer, OrderStatusChange, OrderStatus, Order
+from shops.services.stock import commit_reservations
 from site_settings.models import SiteSettings
 
 
 def pryce_delivery(r_user: Any) -> dict:
-    """Расчет стоимости доставки"""
+    """Расчет стоимости доставки. Сумма берется из снимков цен корзины, устаревшие строки перепроверяются"""
+    cart = Cart.objects.filter(user=r_user).first()
+    if cart is None:
+        return {}
+    revalidate_cart(cart)
     cart_list = (
-        CartItem.objects.filter(cart__user=r_user)
+        CartItem.objects.filter(cart=cart)
         .select_related("offer__product", "offer__shop")
-        .annotate(summ_offer=F("offer__price") * F("quantity"))
+        .annotate(summ_offer=F("price") * F("quantity"))
     )
     if not cart_list:
         return {}
@@ -24,7 +30,7 @@ def pryce_delivery(r_user: Any) -> dict:
     delivery_express = Decimal(sie_settings.express_shipping_price)
     delivery_ordinary = Decimal(sie_settings.standard_shipping_price)
     cart_count_shop = cart_list.all().values_list("offer__shop").distinct().count()
-    total_cost = cart_list.all().aggregate(summ=Sum("summ_offer"))["summ"]
+    total_cost = cart.total_price
 
     if total_cost > min_price_offer and cart_count_shop == 1:
         delivery_ordinary = Decimal(0.00)
@@ -39,13 +45,20 @@ def pryce_delivery(r_user: Any) -> dict:
     }
 
 
+def cart_quantities(cart_dict: dict) -> dict:
+    """Количество товара по id предложений корзины из pryce_delivery"""
+    return {item.offer_id: item.quantity for item in cart_dict.get("query_set_cart", ())}
+
+
 @transaction.atomic
 def save_order_model(r_user: Any, r_post: Any, r_session: Any) -> int:
     """
     Сохранение заказа и истории изменения статуса
+    Списание зарезервированного остатка, при нехватке вызывается OutOfStock
     Стирание корзины
     """
     cart_dict = pryce_delivery(r_user)
+    commit_reservations(r_user, cart_quantities(cart_dict))
 
     if r_post.get("delivery") == "ORDINARY":
         total_cost = cart_dict["total_cost_ordinary"]
@@ -77,4 +90,5 @@ def save_order_model(r_user: Any, r_post: Any, r_session: Any) -> int:
     order_status.save()
     Cart.objects.get(user=r_user).delete()
     r_session[settings.CART_SESSION_ID] = {}
+    r_session.pop(settings.CART_SUMMARY_SESSION_ID, None)
     return new_order.pk
@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+
+from discounts.services.price_materializer import schedule_summary_refresh
+from shops.models import Offer, StockReservation
+
+
+class OutOfStock(Exception):
+    """Исключение, возникающее, если остатка предложений не хватает для заказа"""
+
+    def __init__(self, offer_ids):
+        super().__init__(f"Недостаточно товара: {sorted(offer_ids)}")
+        self.offer_ids = set(offer_ids)
+
+
+def take_stock(offer_id: int, quantity: int) -> bool:
+    """Атомарное списание остатка условным UPDATE ... WHERE stock >= quantity.
+    Возвращает False, если остатка не хватает. Предложение без учета остатка списывается всегда"""
+    if quantity <= 0:
+        return True
+    return bool(
+        Offer.objects.filter(Q(stock__isnull=True) | Q(stock__gte=quantity), pk=offer_id).update(
+            stock=F("stock") - quantity,
+            product_in_stock=Case(
+                When(stock__isnull=True, then=F("product_in_stock")),
+                When(stock__gt=quantity, then=True),
+                default=False,
+            ),
+        )
+    )
+
+
+def return_stock(offer_id: int, quantity: int) -> None:
+    """Возврат остатка предложению"""
+    if quantity > 0:
+        Offer.objects.filter(pk=offer_id, stock__isnull=False).update(
+            stock=F("stock") + quantity, product_in_stock=True
+        )
+
+
+def stock_changed(offer_ids) -> None:
+    """Пересчет сводных цен продуктов после фиксации транзакции, в которой изменился остаток их предложений.
+    Признак наличия меняется UPDATE без сигналов, а от сводной цены зависят фильтр и кэш каталога"""
+    offer_ids = set(offer_ids)
+    if offer_ids:
+        schedule_summary_refresh(Offer.objects.filter(pk__in=offer_ids).values_list("product_id", flat=True))
+
+
+def reserve_cart(user, quantities: dict) -> set:
+    """
+    Резервирует остаток под корзину пользователя на STOCK_RESERVATION_MINUTES минут.
+    Резерв приводится к количеству в корзине: недостающее списывается, лишнее возвращается,
+    резервы предложений, которых больше нет в корзине, снимаются.
+    Возвращает id предложений, остатка которых не хватило
+    :param quantities: dict {id предложения: количество}
+    """
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    limited = set(Offer.objects.filter(pk__in=quantities.keys(), stock__isnull=False).values_list("pk", flat=True))
+    shortages, changed = set(), set()
+    with transaction.atomic():
+        held = {
+            reservation.offer_id: reservation.quantity
+            for reservation in StockReservation.objects.select_for_update().filter(user=user)
+        }
+        reservations = []
+        for offer_id in limited:
+            have = held.pop(offer_id, 0)
+            delta = quantities[offer_id] - have
+            if delta > 0 and not take_stock(offer_id, delta):
+                shortages.add(offer_id)
+                delta = 0
+            elif delta < 0:
+                return_stock(offer_id, -delta)
+            if delta:
+                changed.add(offer_id)
+            if have + delta:
+                reservations.append(
+                    StockReservation(offer_id=offer_id, user=user, quantity=have + delta, expires_at=expires_at)
+                )
+        for offer_id, quantity in held.items():
+            return_stock(offer_id, quantity)
+        stock_changed(changed | held.keys())
+        StockReservation.objects.filter(user=user).exclude(
+            offer_id__in=[item.offer_id for item in reservations]
+        ).delete()
+        StockReservation.objects.bulk_create(
+            reservations,
+            update_conflicts=True,
+            unique_fields=["offer", "user"],
+            update_fields=["quantity", "expires_at"],
+        )
+    return shortages
+
+
+def hold_cart(user, quantities: dict) -> set:
+    """
+    Резерв остатка при открытии страницы оформления заказа.
+    Если действующий резерв пользователя уже соответствует корзине, ничего не пишется и срок резерва не продлевается:
+    повторные открытия страницы с той же корзиной не удерживают остаток дольше STOCK_RESERVATION_MINUTES минут.
+    Возвращает id предложений, остатка которых не хватило
+    :param quantities: dict {id предложения: количество}
+    """
+    limited = Offer.objects.filter(pk__in=quantities.keys(), stock__isnull=False).values_list("pk", flat=True)
+    expected = {offer_id: quantities[offer_id] for offer_id in limited if quantities[offer_id] > 0}
+    reservations = list(StockReservation.objects.filter(user=user).values_list("offer_id", "quantity", "expires_at"))
+    held = {offer_id: quantity for offer_id, quantity, _ in reservations}
+    now = timezone.now()
+    if held == expected and all(expires_at > now for _, _, expires_at in reservations):
+        return set()
+    return reserve_cart(user, quantities)
+
+
+def commit_reservations(user, quantities: dict) -> None:
+    """
+    Окончательное списание остатка при сохранении заказа: резерв дополняется до количества в заказе
+    и удаляется. Если остатка не хватает, вызывается OutOfStock и транзакция заказа откатывается
+    """
+    shortages = reserve_cart(user, quantities)
+    if shortages:
+        raise OutOfStock(shortages)
+    StockReservation.objects.filter(user=user).delete()
+
+
+def release_expired_reservations(batch_size: int = None) -> int:
+    """
+    Возврат остатка по истекшим резервам пачками. Заблокированные оформлением заказа резервы пропускаются.
+    Возвращает количество снятых резервов
+    """
+    batch_size = batch_size or settings.STOCK_RESERVATION_BATCH_SIZE
+    released = 0
+    while True:
+        with transaction.atomic():
+            reservations = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lt=timezone.now())
+                .order_by("expires_at")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not reservations:
+                return released
+            expired = StockReservation.objects.filter(pk__in=reservations)
+            returned = expired.values("offer_id").annotate(total=Sum("quantity")).values_list("offer_id", "total")
+            for offer_id, quantity in returned:
+                return_stock(offer_id, quantity)
+            stock_changed(offer_id for offer_id, _ in returned)
+            released += expired.delete()[0]
+        if len(reservations) < batch_size:
+            return released
@@ -5,6 +5,7 @@ from django.core.cache import cache
 from products.models import Product
 from shops.models import PaymentQueue, OrderStatus
 from shops.services.fake_payment import FakePaymentService
+from shops.services.stock import release_expired_reservations
 
 
 @shared_task
@@ -37,3 +38,9 @@ def process_payment_queue(name="Process payment queue"):
 
         order.save()
         job.delete()
+
+
+@shared_task
+def release_stock_reservations(name="Release stock reservations"):
+    """возврат остатка по истекшим резервам"""
+    return release_expired_reservations()
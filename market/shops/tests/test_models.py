@@ -1,6 +1,7 @@
 from django.test import TestCase
 
 from shops.models import Shop, Offer
+from shops.services.offer_discount import BulkOfferDiscount, OfferDiscount
 from products.models import Product, Property
 from users.models import CustomUser
 
@@ -85,3 +86,32 @@ class OfferModelTest(TestCase):
         offer = OfferModelTest.offer
         decimal_places = offer._meta.get_field("price").decimal_places
         self.assertEqual(decimal_places, 2)
+
+
+class BulkOfferDiscountTest(TestCase):
+    """Класс тестов получения скидок для набора предложений"""
+
+    fixtures = [
+        "fixtures/010_auth_group.json",
+        "fixtures/011_users.json",
+        "fixtures/020_catalog_categories.json",
+        "fixtures/025_products.json",
+        "fixtures/040_shops.json",
+        "fixtures/045_offers.json",
+        "fixtures/075_discounts_shop_item_discount.json",
+    ]
+
+    def test_same_as_offer_discount(self):
+        """Скидки совпадают с расчетом по каждому предложению отдельно"""
+        offers = Offer.objects.select_related("product__category")
+        expected = {offer.id: OfferDiscount(offer)() for offer in offers}
+        self.assertEqual(BulkOfferDiscount(Offer.objects.all())(), expected)
+
+    def test_fixed_number_of_queries(self):
+        """Количество запросов не зависит от количества предложений"""
+        with self.assertNumQueries(2):
+            discounts = BulkOfferDiscount(Offer.objects.all())()
+        offer = Offer.objects.get(id=1)
+        offer._product_discount = discounts[offer.id]
+        with self.assertNumQueries(0):
+            self.assertEqual(offer.price_with_discount, offer.price - discounts[offer.id])
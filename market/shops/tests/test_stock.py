@@ -0,0 +1,142 @@
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from catalog.cache_for_catalog import generation
+from catalog.models import ProductPriceSummary
+from products.models import Product
+from shops.models import Offer, Shop, StockReservation
+from shops.services.stock import (
+    OutOfStock,
+    commit_reservations,
+    hold_cart,
+    release_expired_reservations,
+    reserve_cart,
+)
+from users.models import CustomUser
+
+
+def create_offer(stock: int) -> Offer:
+    user = CustomUser.objects.create(username="stock_shop", email="stock_shop@example.com")
+    shop = Shop.objects.create(name="stock_shop", user=user)
+    return Offer.objects.create(shop=shop, product=Product.objects.create(name="limited"), price=100, stock=stock)
+
+
+class StockReservationTest(TestCase):
+    """Тест резервирования и списания остатка"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.offer = create_offer(stock=3)
+        self.user = CustomUser.objects.create(username="buyer", email="buyer@example.com")
+
+    def stock(self) -> int:
+        self.offer.refresh_from_db()
+        return self.offer.stock
+
+    def test_reserve_follows_cart(self):
+        """Резерв приводится к количеству в корзине"""
+        self.assertEqual(reserve_cart(self.user, {self.offer.id: 2}), set())
+        self.assertEqual(self.stock(), 1)
+        reserve_cart(self.user, {self.offer.id: 1})
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(reserve_cart(self.user, {self.offer.id: 5}), {self.offer.id})
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(StockReservation.objects.get().quantity, 1)
+        reserve_cart(self.user, {})
+        self.assertEqual(self.stock(), 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_summary_follows_stock(self):
+        """Распроданное и возвращенное предложение меняет признак наличия в сводной цене и сбрасывает кэш каталога"""
+        summary = ProductPriceSummary.objects.filter(product_id=self.offer.product_id)
+        global_generation = generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_cart(self.user, {self.offer.id: 3})
+        self.assertFalse(summary.get().in_stock)
+        self.assertGreater(generation(), global_generation)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            release_expired_reservations()
+        self.assertTrue(summary.get().in_stock)
+
+    def test_commit(self):
+        """Заказ списывает остаток окончательно, при нехватке вызывается OutOfStock"""
+        reserve_cart(self.user, {self.offer.id: 1})
+        commit_reservations(self.user, {self.offer.id: 3})
+        self.assertEqual(self.stock(), 0)
+        self.assertFalse(self.offer.product_in_stock)
+        self.assertFalse(StockReservation.objects.exists())
+        with self.assertRaises(OutOfStock):
+            commit_reservations(self.user, {self.offer.id: 1})
+
+    def test_unlimited_offer(self):
+        """Предложения без учета остатка не резервируются"""
+        Offer.objects.filter(pk=self.offer.pk).update(stock=None)
+        commit_reservations(self.user, {self.offer.id: 100})
+        self.assertIsNone(self.stock())
+
+    def test_hold_idempotent(self):
+        """Повторное открытие оформления с той же корзиной не пишет в бд и не продлевает резерв"""
+        self.assertEqual(hold_cart(self.user, {self.offer.id: 2}), set())
+        expires_at = StockReservation.objects.get().expires_at
+        with self.assertNumQueries(2):
+            self.assertEqual(hold_cart(self.user, {self.offer.id: 2}), set())
+        self.assertEqual(StockReservation.objects.get().expires_at, expires_at)
+        self.assertEqual(self.stock(), 1)
+
+        hold_cart(self.user, {self.offer.id: 3})
+        self.assertEqual(self.stock(), 0)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        hold_cart(self.user, {self.offer.id: 3})
+        self.assertGreater(StockReservation.objects.get().expires_at, timezone.now())
+        self.assertEqual(self.stock(), 0)
+
+    def test_release_expired(self):
+        """Истекшие резервы возвращают остаток"""
+        reserve_cart(self.user, {self.offer.id: 3})
+        self.assertFalse(Offer.objects.get(pk=self.offer.pk).product_in_stock)
+        self.assertEqual(release_expired_reservations(), 0)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(release_expired_reservations(batch_size=1), 1)
+        self.assertEqual(self.stock(), 3)
+        self.assertTrue(self.offer.product_in_stock)
+
+
+@skipUnlessDBFeature("has_select_for_update")
+class StockConcurrencyTest(TransactionTestCase):
+    """Параллельное оформление заказов одного предложения не продает больше остатка"""
+
+    buyers = 20
+    stock = 5
+
+    def test_parallel_checkouts(self):
+        offer = create_offer(stock=self.stock)
+        users = [
+            CustomUser.objects.create(username=f"buyer{number}", email=f"buyer{number}@example.com")
+            for number in range(self.buyers)
+        ]
+        results = []
+        start = threading.Barrier(self.buyers)
+
+        def checkout(user):
+            try:
+                start.wait()
+                commit_reservations(user, {offer.id: 1})
+                results.append(True)
+            except OutOfStock:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        offer.refresh_from_db()
+        self.assertEqual(results.count(True), self.stock)
+        self.assertEqual(offer.stock, 0)
@@ -11,6 +11,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
+from cart.cart import Cart
 from catalog.models import Catalog  # noqa F401
 from products.models import Product
 from users.views import MyLoginView
@@ -27,7 +28,8 @@ from shops.services.compare import (
 from shops.services.is_member_of_group import is_member_of_group
 from shops.services.get_paginator import get_paginator
 from shops.services.order import save_order_model
-from shops.services.order import pryce_delivery
+from shops.services.order import pryce_delivery, cart_quantities
+from shops.services.stock import OutOfStock, hold_cart
 from shops.services.limited_products import (
     get_random_limited_edition_product,
     get_top_products,
@@ -132,13 +134,17 @@ class CreateOrderView(TemplateView):
     def get(self, request, *args, **kwargs) -> HttpResponse:
         """Оформления заказа если корзина не пуста и пользователь залогинен"""
         cart_list = None
+        out_of_stock = set()
         if self.request.user.is_authenticated:
+            Cart(request).flush()
             cart_list = pryce_delivery(self.request.user)
             if not cart_list:
                 return redirect("catalog:show_product")
+            out_of_stock = hold_cart(self.request.user, cart_quantities(cart_list))
         context = {
             "form_log": OderLoginUserForm(),
             "cart_list": cart_list,
+            "out_of_stock": out_of_stock,
         }
         return render(request, "market/order/order.jinja2", context=context)
 
@@ -163,7 +169,11 @@ class CreateOrderView(TemplateView):
                         "user": self.request.user,
                     },
                 )
-        new_order_pk = save_order_model(self.request.user, self.request.POST, request.session)
+        Cart(request).flush()
+        try:
+            new_order_pk = save_order_model(self.request.user, self.request.POST, request.session)
+        except OutOfStock:
+            return redirect("order")
         return redirect("payment", pk=new_order_pk)
 
 
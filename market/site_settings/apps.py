@@ -5,3 +5,6 @@ class SiteSettingsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'site_settings'
     verbose_name = 'site settings'
+
+    def ready(self):
+        from site_settings import signals  # noqa F401
@@ -1,4 +1,5 @@
 from products.models import Browsing_history
+from shops.services.offer_discount import prefetch_offer_discounts
 from django.shortcuts import redirect, render, get_object_or_404
 from django.urls import reverse_lazy
 from django.core.mail import send_mail
@@ -100,8 +101,9 @@ class BrowsingHistory(View):
 
     def get(self, request):
         site_settings = SiteSettings.load()
-        history = Browsing_history.objects.filter(users_id=request.user.id).order_by("-data_at")[
-                  :site_settings.maximum_number_of_viewed_products]
+        history = Browsing_history.objects.filter(users_id=request.user.id).select_related("product").order_by(
+            "-data_at")[:site_settings.maximum_number_of_viewed_products]
+        prefetch_offer_discounts(item.product for item in history)
         history_count = Browsing_history.objects.count()
         contex = {"count": history_count, "history": history}
         return render(request, "market/users/browsing_history.jinja2", context=contex)
@@ -109,9 +111,11 @@ class BrowsingHistory(View):
     def post(self, request):
         site_settings = SiteSettings.load()
         product_id = self.request.POST.get("delete")
-        history = Browsing_history.objects.all().order_by("-data_at")[:site_settings.maximum_number_of_viewed_products]
+        history = Browsing_history.objects.all().select_related("product").order_by("-data_at")[
+            :site_settings.maximum_number_of_viewed_products]
         if "delete" in request.POST:
             Browsing_history.objects.filter(product_id=product_id).delete()
+        prefetch_offer_discounts(item.product for item in history)
         history_count = Browsing_history.objects.count()
         contex = {"count": history_count, "history": history}
         return render(request, "market/users/browsing_history.jinja2", context=contex)